@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import time
+from move import Move
+
+EVICT_INTERVAL = 256 # Stores between two size checks
+
+
+def _signed(key: int) -> int:
+    """SQLite integers are signed 64-bit, position hashes unsigned."""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class AnalysisCache:
+    """Persistent search results ((position hash, config) -> best move, score, depth, PV) in SQLite.
+
+    config tells engine configurations apart (see Engine.config_fingerprint):
+    a cache only returns results stored under its own. The database runs in
+    WAL mode, so any number of processes can read while one writes; writers
+    wait for each other up to timeout seconds. A result only replaces a stored
+    one of the same or smaller depth. When the file holds more than
+    max_entries results, the ones stored longest ago are evicted down to nine
+    tenths of it.
+    """
+
+    def __init__(self, path: str, config: str = "", max_entries: int = 1000000, timeout: float = 30.0):
+        if max_entries <= 0:
+            raise ValueError("Analysis cache size must be positive.")
+        self.path = path
+        self.config = config
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout = timeout, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        # Files from before config was stored: their results can not be attributed, start over
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(analysis)")]
+        if columns and "config" not in columns:
+            self.connection.execute("DROP TABLE IF EXISTS analysis")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            "key INTEGER NOT NULL, config TEXT NOT NULL, depth INTEGER NOT NULL, score INTEGER NOT NULL, "
+            "move TEXT NOT NULL, pv TEXT NOT NULL, stored REAL NOT NULL, PRIMARY KEY (key, config))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS analysis_stored ON analysis (stored)")
+        self.stores = 0
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key: int, depth: int = 0):
+        """Stored result searched at least depth plies deep: {depth, score, move, pv} or None."""
+        row = self.connection.execute(
+            "SELECT depth, score, move, pv FROM analysis WHERE key = ? AND config = ? AND depth >= ?",
+            (_signed(key), self.config, depth),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {
+            "depth": row[0],
+            "score": row[1],
+            "move": Move(*json.loads(row[2])),
+            "pv": [Move(*move) for move in json.loads(row[3])],
+        }
+
+    def store(self, key: int, depth: int, score: int, move, pv: list):
+        """Keep the result unless the position is already stored deeper."""
+        self.connection.execute(
+            "INSERT INTO analysis (key, config, depth, score, move, pv, stored) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key, config) DO UPDATE SET depth = excluded.depth, score = excluded.score, "
+            "move = excluded.move, pv = excluded.pv, stored = excluded.stored "
+            "WHERE excluded.depth >= analysis.depth",
+            (_signed(key), self.config, depth, score, json.dumps(list(move)), json.dumps([list(m) for m in pv]), time.time()),
+        )
+        self.stores += 1
+        if self.stores % EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop the oldest results once the cache holds more than max_entries."""
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE") # One process evicts at a time
+            count = self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries * 9 // 10
+                self.connection.execute(
+                    "DELETE FROM analysis WHERE rowid IN (SELECT rowid FROM analysis ORDER BY stored LIMIT ?)", (excess,)
+                )
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def stats(self) -> dict:
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
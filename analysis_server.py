@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from board import Board
+from engine import Engine
+from pgn import square_name, PIECE_LETTERS
+from constants import WHITE, BLACK, TYPE_MASK
+
+STARTING_POSITION = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MAX_DEPTH = 32
+MAX_MULTIPV = 16
+
+
+def move_name(move) -> str:
+    """Coordinate notation of a move, e.g. e2e4 or e7e8q."""
+    name = square_name(move[0]) + square_name(move[1])
+    if len(move) > 2:
+        name += PIECE_LETTERS[move[2] & TYPE_MASK].lower()
+    return name
+
+
+def check_position(board: Board):
+    """Raise ValueError for positions the engine cannot analyse: a missing or extra king, or the side not to move in check."""
+    for color, name in ((WHITE, "white"), (BLACK, "black")):
+        if board.board_pieces.count(6 + color) != 1:
+            raise ValueError(f"{name} needs exactly one king")
+    waiting = BLACK if board.active_color == 'w' else WHITE
+    if board.is_square_attacked(board.board_pieces.index(6 + waiting), waiting):
+        raise ValueError("side not to move is in check")
+
+
+def worker_main(connection, engine_options: dict):
+    """Worker process: one warm Engine analysing the jobs sent over connection.
+
+    Messages in are ("analyse", job_id, fen, depth, time, multipv) and
+    ("stop", job_id); out go ("info", job_id, result) after every depth and
+    ("done", job_id, result or None, stopped, error or None).
+    """
+    engine = Engine(Board(STARTING_POSITION), **engine_options)
+    jobs = queue.Queue()
+    stopped_jobs = set()
+    current_job = [None]
+
+    # Listen for stop requests while a job is running
+    def listen():
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                jobs.put(None)
+                return
+            if message[0] == "stop":
+                stopped_jobs.add(message[1])
+                if current_job[0] == message[1]:
+                    engine.stop()
+            else:
+                jobs.put(message)
+
+    threading.Thread(target = listen, daemon = True).start()
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            return
+        _, job_id, fen, depth, time, multipv = message
+        current_job[0] = job_id
+
+        result = None
+        error = None
+        try:
+            for info in engine.analyse(Board(fen), depth = depth, time = time, multipv = multipv):
+                if job_id in stopped_jobs:
+                    break
+                result = {
+                    "depth": info["depth"],
+                    "nodes": info["nodes"],
+                    "seconds": round(info["seconds"], 3),
+                    "lines": [
+                        {"move": move_name(line["move"]), "score": line["score"], "pv": [move_name(m) for m in line["pv"]]}
+                        for line in info["lines"]
+                    ],
+                }
+                connection.send(("info", job_id, result))
+        except Exception as e: # One broken position must not take the worker down
+            result = None
+            error = f"analysis failed: {type(e).__name__}: {e}"
+
+        current_job[0] = None
+        connection.send(("done", job_id, result, job_id in stopped_jobs, error))
+        stopped_jobs.discard(job_id)
+
+
+class Job:
+    def __init__(self, job_id, request_id, fen: str, key: int, depth: int, time: float, multipv: int, writer):
+        self.job_id = job_id
+        self.request_id = request_id
+        self.fen = fen
+        self.key = key
+        self.depth = depth
+        self.time = time
+        self.multipv = multipv
+        self.writer = writer
+        self.connection = None # Worker pipe once the job is running
+        self.cancelled = False
+
+
+class ResultCache:
+    """LRU cache of finished analyses keyed by position hash."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, job: Job):
+        """Cached result at least as deep / long / wide as the job asks for."""
+        entry = self.entries.get(job.key)
+        if entry is not None:
+            result, time = entry
+            deep_enough = job.depth is not None and result["depth"] >= job.depth
+            long_enough = job.time is not None and time is not None and time >= job.time
+            if (deep_enough or long_enough) and len(result["lines"]) >= job.multipv:
+                self.entries.move_to_end(job.key)
+                self.hits += 1
+                return dict(result, lines = result["lines"][:job.multipv])
+        self.misses += 1
+        return None
+
+    def store(self, job: Job, result: dict):
+        entry = self.entries.get(job.key)
+        if entry is not None and entry[0]["depth"] > result["depth"]:
+            return # Keep the deeper analysis
+        self.entries[job.key] = (result, job.time)
+        self.entries.move_to_end(job.key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last = False)
+
+
+class AnalysisServer:
+    """Line-JSON analysis server backed by a pool of warm engine processes.
+
+    Requests (one JSON object per line):
+        {"id": 1, "fen": "...", "depth": 6, "multipv": 3}
+        {"id": 2, "fen": "...", "time": 2.5}
+        {"cancel": 1}
+    Replies are {"id", "type": "info"} lines per finished depth, then one
+    "result", "cancelled" or "error" line. When queue_size jobs are already
+    waiting new requests are refused with a "busy" error.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = 64, cache_size: int = 10000, engine_options: dict = None):
+        self.worker_count = workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.engine_options = engine_options or {}
+        self.cache = ResultCache(cache_size)
+        self.queue = None
+        self.workers = []
+        self.tasks = []
+        self.jobs = {} # (writer, request id) -> Job
+        self.job_ids = itertools.count()
+        self.executor = ThreadPoolExecutor(self.worker_count) # One blocking pipe reader per worker
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765):
+        self.queue = asyncio.Queue(self.queue_size)
+        for index in range(self.worker_count):
+            self.workers.append(self._start_worker())
+            self.tasks.append(asyncio.create_task(self._dispatch(index)))
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server
+
+    def _start_worker(self) -> tuple:
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target = worker_main, args = (child_connection, self.engine_options), daemon = True)
+        process.start()
+        child_connection.close() # Only the worker holds this end, so its death shows up as EOFError
+        return process, parent_connection
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        for process, connection in self.workers:
+            connection.close()
+            process.terminate()
+            process.join()
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+    async def _send(self, writer, message: dict):
+        if writer.is_closing():
+            return
+        try:
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain() # Slow readers hold back their own replies only
+        except ConnectionError:
+            pass # Client gone: _handle_client cancels its jobs
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    await self._send(writer, {"type": "error", "error": "invalid JSON"})
+                    continue
+                if "cancel" in request:
+                    await self._cancel(writer, request["cancel"])
+                else:
+                    await self._submit(writer, request)
+        except ConnectionError:
+            pass # Client went away
+        finally:
+            # Drop everything the client still has queued or running
+            for (owner, request_id), job in list(self.jobs.items()):
+                if owner is writer:
+                    await self._cancel(writer, request_id, notify = False)
+            writer.close()
+
+    async def _submit(self, writer, request: dict):
+        request_id = request.get("id")
+        try:
+            fen = request.get("fen", STARTING_POSITION)
+            depth = request.get("depth")
+            time = request.get("time")
+            multipv = min(max(int(request.get("multipv", 1)), 1), MAX_MULTIPV)
+            if depth is None and time is None:
+                raise ValueError("depth or time required")
+            depth = min(int(depth), MAX_DEPTH) if depth is not None else None
+            time = float(time) if time is not None else None
+            board = Board(fen)
+            check_position(board)
+            key = board.hash
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            await self._send(writer, {"id": request_id, "type": "error", "error": f"bad request: {e}"})
+            return
+        if (writer, request_id) in self.jobs:
+            await self._send(writer, {"id": request_id, "type": "error", "error": "duplicate id"})
+            return
+
+        job = Job(next(self.job_ids), request_id, fen, key, depth, time, multipv, writer)
+        cached = self.cache.probe(job)
+        if cached is not None:
+            await self._send(writer, {"id": request_id, "type": "result", "cached": True, **cached})
+            return
+
+        # Backpressure: refuse instead of queueing without bound
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            await self._send(writer, {"id": request_id, "type": "error", "error": "busy"})
+            return
+        self.jobs[(writer, request_id)] = job
+
+    async def _cancel(self, writer, request_id, notify: bool = True):
+        job = self.jobs.pop((writer, request_id), None)
+        if job is None:
+            return
+        job.cancelled = True
+        if job.connection is not None:
+            try:
+                job.connection.send(("stop", job.job_id)) # Running: the worker reports back
+            except OSError:
+                pass # Worker just died: _dispatch reports the job
+        elif notify:
+            await self._send(writer, {"id": request_id, "type": "cancelled"})
+
+    async def _dispatch(self, index: int):
+        """Feed worker process index from the queue, forwarding its progress; a dead worker is replaced."""
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                continue
+            process, connection = self.workers[index]
+            job.connection = connection
+            try:
+                connection.send(("analyse", job.job_id, job.fen, job.depth, job.time, job.multipv))
+                alive = True
+            except OSError:
+                alive = False
+            if alive:
+                alive = await self._run_job(job, connection)
+            if not alive:
+                # The worker died: fail its job and start a fresh one in its place
+                job.connection = None
+                self.jobs.pop((job.writer, job.request_id), None)
+                await self._send(job.writer, {"id": job.request_id, "type": "error", "error": "worker crashed"})
+                connection.close()
+                process.terminate()
+                await asyncio.to_thread(process.join, 5)
+                self.workers[index] = self._start_worker()
+
+    async def _run_job(self, job: Job, connection) -> bool:
+        """Forward one job's progress until the worker reports it done; False if the worker died."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                message = await loop.run_in_executor(self.executor, connection.recv)
+            except (EOFError, OSError):
+                return False
+            if message[0] == "info":
+                if not job.cancelled:
+                    await self._send(job.writer, {"id": job.request_id, "type": "info", **message[2]})
+                continue
+
+            _, _, result, stopped, error = message
+            if result is not None and not stopped:
+                self.cache.store(job, result)
+            if job.cancelled or stopped:
+                await self._send(job.writer, {"id": job.request_id, "type": "cancelled"})
+            elif error is not None:
+                await self._send(job.writer, {"id": job.request_id, "type": "error", "error": error})
+            elif result is None:
+                await self._send(job.writer, {"id": job.request_id, "type": "error", "error": "no legal moves"})
+            else:
+                await self._send(job.writer, {"id": job.request_id, "type": "result", "cached": False, **result})
+            self.jobs.pop((job.writer, job.request_id), None)
+            return True
+
+
+async def serve(host: str, port: int, workers: int, queue_size: int, engine_options: dict):
+    server = AnalysisServer(workers, queue_size, engine_options = engine_options)
+    await server.start(host, port)
+    print(f"Analysing on {host}:{port} with {server.worker_count} workers")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Line-JSON position analysis server.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--queue-size", type = int, default = 64)
+    parser.add_argument("--tablebases", help = "tablebase directory for the engines")
+    parser.add_argument("--cache", help = "persistent analysis cache (SQLite file) shared by the engines")
+    args = parser.parse_args()
+
+    options = {"tablebase_path": args.tablebases} if args.tablebases else {}
+    if args.cache:
+        options["analysis_cache_path"] = args.cache
+    asyncio.run(serve(args.host, args.port, args.workers, args.queue_size, options))
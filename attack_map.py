@@ -0,0 +1,203 @@
+from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK
+
+ORTHOGONAL = [-8, 8, -1, 1]
+DIAGONAL = [-9, -7, 7, 9]
+
+
+def _walk(square: int, direction: int) -> list:
+    """Squares from square (excluded) to the board edge along direction."""
+    ray = []
+    current_index = square
+    while True:
+        prev_col = current_index % 8
+        current_index += direction
+        if not (0 <= current_index < 64): break
+        if abs((current_index % 8) - prev_col) > 1: break # Edge wrap check
+        ray.append(current_index)
+    return ray
+
+
+def _jumps(square: int, offsets: list, max_distance: int) -> list:
+    targets = []
+    for offset in offsets:
+        target = square + offset
+        if 0 <= target < 64 and abs((target % 8) - (square % 8)) <= max_distance:
+            targets.append(target)
+    return targets
+
+
+# Precomputed, wrap-safe geometry
+RAYS = [{d: _walk(square, d) for d in ORTHOGONAL + DIAGONAL} for square in range(64)]
+KNIGHT_TARGETS = [_jumps(square, [-17, -15, -10, -6, 6, 10, 15, 17], 2) for square in range(64)]
+KING_TARGETS = [_jumps(square, [-9, -8, -7, -1, 1, 7, 8, 9], 1) for square in range(64)]
+# Squares a pawn of this color attacks from each square
+PAWN_ATTACKS = {
+    WHITE: [_jumps(square, [-9, -7], 1) for square in range(64)],
+    BLACK: [_jumps(square, [7, 9], 1) for square in range(64)],
+}
+# Direction from a to b if they share a line (0 otherwise)
+DIRECTION = [[0] * 64 for _ in range(64)]
+for _square in range(64):
+    for _d in ORTHOGONAL + DIAGONAL:
+        for _target in RAYS[_square][_d]:
+            DIRECTION[_square][_target] = _d
+
+
+def _line_table(square: int, line: tuple) -> tuple:
+    """Lookup tables of one line (two opposite rays) through square.
+
+    Returns (mask, targets, ends): the mask leaves out the last square of each
+    ray (a piece there blocks nothing), and the two dicts map every masked
+    occupancy to the attacked squares and to the last attacked square of each
+    ray (the blocker, or the board edge).
+    """
+    mask = 0
+    for d in line:
+        for target in RAYS[square][d][:-1]:
+            mask |= 1 << target
+
+    targets, ends = {}, {}
+    occupancy = 0
+    while True: # Every subset of mask (carry-rippler)
+        squares, last = [], []
+        for d in line:
+            for target in RAYS[square][d]:
+                squares.append(target)
+                if occupancy >> target & 1:
+                    break
+            if RAYS[square][d]:
+                last.append(squares[-1])
+        targets[occupancy] = tuple(squares)
+        ends[occupancy] = tuple(last)
+        occupancy = (occupancy - mask) & mask
+        if occupancy == 0:
+            break
+    return mask, targets, ends
+
+
+# Occupancy-indexed slider attacks: per square, the tables of each line
+# (rank, file, diagonal, anti-diagonal) looked up by the line's occupancy.
+# Bitboards use bit n for square n (a8 = bit 0), like board_pieces.
+ROOK_LINES = [(_line_table(square, (-1, 1)), _line_table(square, (-8, 8))) for square in range(64)]
+BISHOP_LINES = [(_line_table(square, (-9, 9)), _line_table(square, (-7, 7))) for square in range(64)]
+QUEEN_LINES = [ROOK_LINES[square] + BISHOP_LINES[square] for square in range(64)]
+SLIDER_LINES = {3: BISHOP_LINES, 4: ROOK_LINES, 5: QUEEN_LINES}
+
+
+def occupancy(board_pieces) -> int:
+    """Bitboard of the occupied squares."""
+    occupied = 0
+    for square, piece in enumerate(board_pieces):
+        if piece != 0:
+            occupied |= 1 << square
+    return occupied
+
+
+class AttackMap:
+    """Number of pieces of each side attacking every square of one position.
+
+    Attacks follow Board.is_square_attacked: sliders stop at the first piece
+    of any color, and occupied squares (own pieces too) count as attacked.
+    """
+
+    def __init__(self, board_pieces, occupied: int = None):
+        self.counts = {WHITE: [0] * 64, BLACK: [0] * 64}
+        if occupied is None:
+            occupied = occupancy(board_pieces)
+
+        for square, piece in enumerate(board_pieces):
+            if piece == 0:
+                continue
+            counts = self.counts[piece & COLOR_MASK]
+            piece_type = piece & TYPE_MASK
+
+            match piece_type:
+                case 1: # Pawn
+                    for target in PAWN_ATTACKS[piece & COLOR_MASK][square]:
+                        counts[target] += 1
+                case 2: # Knight
+                    for target in KNIGHT_TARGETS[square]:
+                        counts[target] += 1
+                case 6: # King
+                    for target in KING_TARGETS[square]:
+                        counts[target] += 1
+                case _: # Sliding pieces
+                    for mask, targets, _ in SLIDER_LINES[piece_type][square]:
+                        for target in targets[occupied & mask]:
+                            counts[target] += 1
+
+    def is_attacked(self, square: int, active_color: int) -> bool:
+        """Same question as Board.is_square_attacked: is square attacked by the enemy of active_color?"""
+        return self.counts[BLACK if active_color == WHITE else WHITE][square] > 0
+
+    def attackers(self, square: int, color: int) -> int:
+        """Number of pieces of color attacking square."""
+        return self.counts[color][square]
+
+
+def find_checkers(board_pieces, king_square: int, active_color: int, occupied: int = None) -> list:
+    """Squares of the enemy pieces giving check to the king on king_square."""
+    if occupied is None:
+        occupied = occupancy(board_pieces)
+    enemy_color = BLACK if active_color == WHITE else WHITE
+    checkers = []
+
+    for target in KNIGHT_TARGETS[king_square]:
+        if board_pieces[target] == 2 + enemy_color:
+            checkers.append(target)
+
+    # Enemy pawns sit where our own pawn would attack
+    for target in PAWN_ATTACKS[active_color][king_square]:
+        if board_pieces[target] == 1 + enemy_color:
+            checkers.append(target)
+
+    # First piece on every line: enemy rook/queen or bishop/queen
+    for lines, slider_types in ((ROOK_LINES, (4, 5)), (BISHOP_LINES, (3, 5))):
+        for mask, _, ends in lines[king_square]:
+            for target in ends[occupied & mask]:
+                piece = board_pieces[target]
+                if (piece & COLOR_MASK) == enemy_color and (piece & TYPE_MASK) in slider_types:
+                    checkers.append(target)
+
+    return checkers
+
+
+def find_pinners(board_pieces, king_square: int, active_color: int, occupied: int = None) -> list:
+    """(pinned square, pinner square) for every enemy slider behind exactly one own piece."""
+    if occupied is None:
+        occupied = occupancy(board_pieces)
+    pinners = []
+    for lines, slider_types in ((ROOK_LINES, (4, 5)), (BISHOP_LINES, (3, 5))):
+        for mask, _, ends in lines[king_square]:
+            for pinned in ends[occupied & mask]:
+                if (board_pieces[pinned] & COLOR_MASK) != active_color:
+                    continue
+                # Look through the own piece: the next piece on the same ray
+                d = DIRECTION[king_square][pinned]
+                for pinner in ends[(occupied ^ (1 << pinned)) & mask]:
+                    piece = board_pieces[pinner]
+                    if DIRECTION[king_square][pinner] == d and (piece & COLOR_MASK) != active_color and (piece & TYPE_MASK) in slider_types:
+                        pinners.append((pinned, pinner))
+    return pinners
+
+
+def find_pins(board_pieces, king_square: int, active_color: int, occupied: int = None) -> dict:
+    """Pinned piece square -> squares it may still move to (the pin line, pinner included)."""
+    pins = {}
+    for pinned, pinner in find_pinners(board_pieces, king_square, active_color, occupied):
+        ray = RAYS[king_square][DIRECTION[king_square][pinner]]
+        pins[pinned] = set(ray[:ray.index(pinner) + 1])
+    return pins
+
+
+def check_block_squares(king_square: int, checker: int) -> set:
+    """Squares that resolve a single check: capturing the checker or blocking its line."""
+    d = DIRECTION[king_square][checker]
+    if d == 0:
+        return {checker} # Knight or pawn
+    squares = set()
+    for target in RAYS[king_square][d]:
+        squares.add(target)
+        if target == checker:
+            break
+    return squares
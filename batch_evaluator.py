@@ -0,0 +1,155 @@
+import numpy as np
+from constants import WHITE, BLACK, PHASE_WEIGHTS, MAX_PHASE
+from evaluator import DEFAULT_PARAMETERS, TERMS, PIECE_FEATURES, load_parameters
+
+
+class BatchEvaluator:
+    """Vectorized version of Evaluator that scores N positions at once.
+
+    Positions are an (N, 64) int8 array with the same encoding as Board.board_pieces.
+    Every feature and term returns an (N,) int array equal to the matching Evaluator one.
+    """
+
+    # King position needs attack maps and ray walks, so it stays in the scalar Evaluator
+    VECTORIZED_TERMS = ["material", "pawn_structure", "pieces_combination"]
+
+    def __init__(self, parameters_path: str = None):
+        self.parameters = load_parameters(parameters_path) if parameters_path else dict(DEFAULT_PARAMETERS)
+
+        self.phase_weights = np.array([PHASE_WEIGHTS[code & 7] for code in range(32)], dtype = np.int32)
+
+        # Pawn tables for the center control features: pawns on e4, d4, e5, d5,
+        # and every square next to one of them on the same rank (once per neighbour)
+        center_squares = [27, 28, 35, 36]
+        self.center_pawn_table = np.zeros(64, dtype = np.int32)
+        self.center_neighbour_table = np.zeros(64, dtype = np.int32)
+        for pos in center_squares:
+            self.center_pawn_table[pos] += 1
+            file = pos % 8
+            rank = pos // 8
+            for adj_file in [file - 1, file + 1]:
+                if 0 <= adj_file <= 7:
+                    self.center_neighbour_table[rank * 8 + adj_file] += 1
+
+        self.row_index = np.arange(8).reshape(1, 8, 1)
+
+    def positions_from_boards(self, boards) -> np.ndarray:
+        return np.array([board.board_pieces for board in boards], dtype = np.int8).reshape(-1, 64)
+
+    def phase(self, positions: np.ndarray) -> np.ndarray:
+        return np.minimum(self.phase_weights[positions].sum(axis = 1), MAX_PHASE)
+
+    def evaluate(self, positions: np.ndarray) -> np.ndarray:
+        """Sum of the vectorized terms (king position is scalar only)."""
+        return sum(self.evaluate_terms(positions).values())
+
+    def evaluate_terms(self, positions: np.ndarray) -> dict:
+        positions = np.asarray(positions, dtype = np.int8).reshape(-1, 64)
+        features = self.features(positions)
+        phase = self.phase(positions)
+
+        scores = {}
+        for term in self.VECTORIZED_TERMS:
+            mg = eg = 0
+            for name in TERMS[term]:
+                mg = mg + features[name] * self.parameters[name][0]
+                eg = eg + features[name] * self.parameters[name][1]
+            scores[term] = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+        return scores
+
+    def features(self, positions: np.ndarray) -> dict:
+        """Feature counts (white minus black) of the vectorized terms."""
+        positions = np.asarray(positions, dtype = np.int8).reshape(-1, 64)
+        features = {}
+        features.update(self.material_features(positions))
+        features.update(self.pawn_structure_features(positions))
+        features.update(self.pieces_combination_features(positions))
+        return features
+
+    def material_features(self, positions: np.ndarray) -> dict:
+        features = {}
+        for piece_type, name in PIECE_FEATURES.items():
+            features[name] = (np.count_nonzero(positions == piece_type + WHITE, axis = 1)
+                              - np.count_nonzero(positions == piece_type + BLACK, axis = 1))
+
+        # Rook on open file: every white rook counts the file of the first
+        # white rook found on the board (Evaluator uses board_pieces.index)
+        white_rooks = positions == 4 + WHITE
+        rook_count = white_rooks.sum(axis = 1)
+        first_rook_file = white_rooks.argmax(axis = 1) % 8
+        pawn_files = ((positions & 7) == 1).reshape(-1, 8, 8).any(axis = 1)
+        pawns_in_file = pawn_files[np.arange(len(positions)), first_rook_file]
+        features["rook_open_file"] = rook_count * (2 - pawns_in_file.astype(np.int32))
+
+        return features
+
+    def pawn_structure_features(self, positions: np.ndarray) -> dict:
+        # (N, rank, file) masks
+        white_pawns = (positions == 1 + WHITE).reshape(-1, 8, 8)
+        black_pawns = (positions == 1 + BLACK).reshape(-1, 8, 8)
+        white_file_counts = white_pawns.sum(axis = 1)
+        black_file_counts = black_pawns.sum(axis = 1)
+
+        # Doubled pawns
+        doubled = (np.maximum(white_file_counts - 1, 0).sum(axis = 1)
+                   - np.maximum(black_file_counts - 1, 0).sum(axis = 1))
+
+        # Isolated pawns (one per file, edge files are never isolated)
+        isolated = self._isolated_files(white_file_counts) - self._isolated_files(black_file_counts)
+
+        # Passed pawns
+        # White pawn is passed if no black pawn on adjacent files has a greater rank index
+        black_max_rank = np.where(black_pawns, self.row_index, -1).max(axis = 1)
+        black_max_rank = self._adjacent_files(black_max_rank, np.maximum, -1)
+        white_passed = white_pawns & (self.row_index >= black_max_rank[:, None, :])
+
+        # Black pawn is passed if no white pawn on adjacent files has a smaller rank index
+        white_min_rank = np.where(white_pawns, self.row_index, 8).min(axis = 1)
+        white_min_rank = self._adjacent_files(white_min_rank, np.minimum, 8)
+        black_passed = black_pawns & (self.row_index <= white_min_rank[:, None, :])
+        passed = white_passed.sum(axis = (1, 2)) - black_passed.sum(axis = (1, 2))
+
+        # Pawns controlling center
+        white_pawns = white_pawns.reshape(-1, 64).astype(np.int32)
+        black_pawns = black_pawns.reshape(-1, 64).astype(np.int32)
+
+        return {
+            "doubled_pawn": doubled,
+            "isolated_pawn": isolated,
+            "passed_pawn": passed,
+            "center_pawn": (white_pawns - black_pawns) @ self.center_pawn_table,
+            "center_pawn_neighbour": (white_pawns - black_pawns) @ self.center_neighbour_table,
+        }
+
+    def pieces_combination_features(self, positions: np.ndarray) -> dict:
+        white_pair = np.count_nonzero(positions == 3 + WHITE, axis = 1) >= 2
+        black_pair = np.count_nonzero(positions == 3 + BLACK, axis = 1) >= 2
+        return {"bishop_pair": white_pair.astype(np.int32) - black_pair.astype(np.int32)}
+
+    def _isolated_files(self, file_counts: np.ndarray) -> np.ndarray:
+        has_pawn = file_counts > 0
+        has_pawn[:, [0, 7]] = False
+        left = np.zeros_like(has_pawn)
+        right = np.zeros_like(has_pawn)
+        left[:, 1:] = has_pawn[:, :-1]
+        right[:, :-1] = has_pawn[:, 1:]
+        return (has_pawn & ~left & ~right).sum(axis = 1)
+
+    def _adjacent_files(self, per_file: np.ndarray, reduce, fill) -> np.ndarray:
+        """Combine each file with its two neighbours (fill is used off the board)."""
+        padded = np.pad(per_file, ((0, 0), (1, 1)), constant_values = fill)
+        return reduce(reduce(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+
+
+if __name__ == "__main__":
+    import time
+    from board import Board
+
+    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    batch = BatchEvaluator()
+    positions = np.repeat(batch.positions_from_boards([Board(fen)]), 200000, axis = 0)
+
+    start_time = time.time()
+    scores = batch.evaluate(positions)
+    elapsed = time.time() - start_time
+    print(f"Evaluated {len(positions)} positions in {elapsed:.3f} seconds ({len(positions) / elapsed:.0f} pos/s)")
@@ -0,0 +1,52 @@
+import argparse
+import time
+from board import Board
+from engine import Engine
+
+BENCH_POSITIONS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqk2r/ppp2ppp/2n2n2/2bpp1B1/2B1P3/P2P1N2/1PP3PP/RN1QK2R w KQkq - 0 1",
+    "rn1qk2r/pp2ppbp/2p2np1/3p4/2PPb1PN/4P3/PP2BP1P/RNBQK2R w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+]
+
+FEATURES = ["null_move", "lmr", "futility", "check_extensions", "pvs", "aspiration"]
+
+
+def run_bench(depth: int, options: dict, positions: list = None) -> dict:
+    """Search every bench position with fresh engines, summing nodes, time and feature counters."""
+    totals = {"nodes": 0, "seconds": 0.0}
+    for fen in positions or BENCH_POSITIONS:
+        engine = Engine(Board(fen), depth = depth, **options)
+        start_time = time.time()
+        engine.search(depth)
+        totals["seconds"] += time.time() - start_time
+        for name, count in engine.stats.items():
+            totals[name] = totals.get(name, 0) + count
+    totals["nps"] = totals["nodes"] / totals["seconds"] if totals["seconds"] else 0.0
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Fixed-depth search benchmark.")
+    parser.add_argument("--depth", type = int, default = 3)
+    args = parser.parse_args()
+
+    configurations = [("all features", {})]
+    configurations += [(f"without {feature}", {feature: False}) for feature in FEATURES]
+    configurations += [("no features", {feature: False for feature in FEATURES})]
+
+    print(f"{'configuration':<28}{'nodes':>10}{'seconds':>10}{'nps':>10}")
+    results = {}
+    for name, options in configurations:
+        totals = run_bench(args.depth, options)
+        results[name] = totals
+        print(f"{name:<28}{totals['nodes']:>10}{totals['seconds']:>10.2f}{totals['nps']:>10.0f}")
+
+    print()
+    print("Feature counters (all features):")
+    for name, count in results["all features"].items():
+        if name not in ["nodes", "seconds", "nps"]:
+            print(f"  {name:<26}{count:>10}")
@@ -1,13 +1,60 @@
-from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK
+from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK, NO_SQUARE, PHASE_WEIGHTS
+from constants import WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE
 from move import Move
+from attack_map import AttackMap, occupancy, ROOK_LINES, BISHOP_LINES, KNIGHT_TARGETS, KING_TARGETS, PAWN_ATTACKS
+from zobrist import polyglot_key, en_passant_key, PIECE_KEYS, CASTLING_KEYS, TURN_KEY
+
+PIECE_TABLE = {
+    'p': 1 + BLACK, 'n': 2 + BLACK, 'b': 3 + BLACK, 'r': 4 + BLACK, 'q': 5 + BLACK, 'k': 6 + BLACK,
+    'P': 1 + WHITE, 'N': 2 + WHITE, 'B': 3 + WHITE, 'R': 4 + WHITE, 'Q': 5 + WHITE, 'K': 6 + WHITE
+}
+PIECE_SYMBOLS = {piece: symbol for symbol, piece in PIECE_TABLE.items()}
+CASTLING_LETTERS = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+
+# King move -> (rook origin, rook destination) for castling
+CASTLING_ROOK_SQUARES = {(60, 62): (63, 61), (60, 58): (56, 59), (4, 6): (7, 5), (4, 2): (0, 3)}
+
+# Castling rights kept when a piece leaves or lands on a square (king and rook squares)
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[63] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[56] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[7] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[0] = 15 & ~BLACK_QUEENSIDE
+
+# Material signatures where neither side can ever mate (bishops of one square color are checked apart)
+INSUFFICIENT_MATERIAL = {"KvK", "KNvK", "KvKN", "KBvK", "KvKB"}
+
+
+def game_phase(board_pieces) -> int:
+    """Sum of PHASE_WEIGHTS over the pieces (MAX_PHASE at the start, more after promotions)."""
+    return sum(PHASE_WEIGHTS[piece & TYPE_MASK] for piece in board_pieces)
+
+
+def material_name(board_pieces) -> str:
+    """Material signature like 'KQvK' (pieces sorted from king to pawn)."""
+    white = sorted(p & TYPE_MASK for p in board_pieces if p != 0 and (p & COLOR_MASK) == WHITE)
+    black = sorted(p & TYPE_MASK for p in board_pieces if p != 0 and (p & COLOR_MASK) == BLACK)
+    return ''.join(PIECE_SYMBOLS[t + WHITE] for t in reversed(white)) + 'v' + ''.join(PIECE_SYMBOLS[t + WHITE] for t in reversed(black))
+
+
+def square_name(square: int) -> str:
+    return chr(ord('a') + square % 8) + str(8 - square // 8)
+
+
+def square_index(name: str) -> int:
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
+
 
 class Board:
+    __slots__ = (
+        "board_pieces", "active_color", "castling_rights", "en_passant", "halfmove_clock",
+        "fullmove_number", "fen", "phase", "occupied", "hash", "history", "undo_stack", "attack_cache",
+    )
+
     def __init__(self, fen):
         self.board_pieces = [0] * 64
-        self.piece_map = {
-            'p': 1 + BLACK, 'n': 2 + BLACK, 'b': 3 + BLACK, 'r': 4 + BLACK, 'q': 5 + BLACK, 'k': 6 + BLACK,
-            'P': 1 + WHITE, 'N': 2 + WHITE, 'B': 3 + WHITE, 'R': 4 + WHITE, 'Q': 5 + WHITE, 'K': 6 + WHITE
-        }
         self.load_fen(fen)
 
     def load_fen(self, fen):
@@ -21,94 +68,196 @@ class Board:
                 if char.isdigit():
                     col_idx += int(char)
                 else:
-                    self.board_pieces[row_idx * 8 + col_idx] = self.piece_map[char]
+                    self.board_pieces[row_idx * 8 + col_idx] = PIECE_TABLE[char]
                     col_idx += 1
 
-        # Other data
+        # Other data: castling rights as a bitmask, en passant target as a square index
         self.active_color = fen_parts[1]
-        self.castling_rights = fen_parts[2]
-        self.en_passant = fen_parts[3]
+        self.castling_rights = 0
+        for letter in fen_parts[2]:
+            self.castling_rights |= CASTLING_LETTERS.get(letter, 0)
+        self.en_passant = square_index(fen_parts[3]) if fen_parts[3] != '-' else NO_SQUARE
         self.halfmove_clock = int(fen_parts[4])
         self.fullmove_number = int(fen_parts[5])
 
         # Save also the FEN itself
         self.fen = fen
 
+        # Game phase and occupied squares bitboard, kept up to date by make_move
+        self.phase = game_phase(self.board_pieces)
+        self.occupied = occupancy(self.board_pieces)
+
+        # Position hash, hashes of earlier positions and undo information
+        self.hash = polyglot_key(self)
+        self.history = []
+        self.undo_stack = []
+        self.attack_cache = None
+
+    def copy(self) -> "Board":
+        """Independent copy of the position, with its repetition history but no undo stack."""
+        board = Board.__new__(Board)
+        board.board_pieces = self.board_pieces[:]
+        board.active_color = self.active_color
+        board.castling_rights = self.castling_rights
+        board.en_passant = self.en_passant
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.fen = self.fen
+        board.phase = self.phase
+        board.occupied = self.occupied
+        board.hash = self.hash
+        board.history = self.history[:]
+        board.undo_stack = []
+        board.attack_cache = self.attack_cache # Never modified, safe to share
+        return board
+
     def move_piece(self, move):
+        self.make_move(move)
+
+        # Update FEN
+        self.fen = self.generate_fen()
+        print(f"Updated FEN: {self.fen}")
+
+    def make_move(self, move):
+        """Play a move, saving what unmake_move needs to take it back."""
         src, dest, *promotion = move
         piece = self.board_pieces[src]
         captured_piece = self.board_pieces[dest]
         piece_type = piece & TYPE_MASK
 
-        self.pseudo_move(src, dest, piece, piece_type, promotion)
+        # Squares this move can change: castling rook and en passant victim too
+        touched = [src, dest]
+        if piece_type == 6 and (src, dest) in CASTLING_ROOK_SQUARES:
+            touched.extend(CASTLING_ROOK_SQUARES[(src, dest)])
+        if piece_type == 1 and dest == self.en_passant:
+            touched.append(dest + 8 if self.active_color == 'w' else dest - 8)
+        saved_squares = [(square, self.board_pieces[square]) for square in touched]
 
-        # --- Castling Rights Logic ---
-        
-        # 1. King Move: Remove all rights for the active player
-        if piece_type == 6: 
-            if self.active_color == 'w':
-                self.castling_rights = self.castling_rights.replace('K', '').replace('Q', '')
-            else: # active_color == 'b'
-                self.castling_rights = self.castling_rights.replace('k', '').replace('q', '')
+        self.undo_stack.append((
+            saved_squares, self.castling_rights, self.en_passant,
+            self.halfmove_clock, self.fullmove_number, self.phase, self.hash
+        ))
+        self.history.append(self.hash)
+        self.attack_cache = None
 
-        # 2. Rook Move: Remove specific side right
-        if piece_type == 4:
-            if self.active_color == 'w':
-                if src == 56: self.castling_rights = self.castling_rights.replace('Q', '')
-                if src == 63: self.castling_rights = self.castling_rights.replace('K', '')
-            else: # active_color == 'b'
-                if src == 0: self.castling_rights = self.castling_rights.replace('q', '')
-                if src == 7: self.castling_rights = self.castling_rights.replace('k', '')
-
-        # 3. Rook Capture: If a rook is captured, the opponent loses rights for that side
-        if (captured_piece & TYPE_MASK) == 4:
-            # If White captures a Black rook
-            if self.active_color == 'w':
-                if dest == 0: self.castling_rights = self.castling_rights.replace('q', '')
-                if dest == 7: self.castling_rights = self.castling_rights.replace('k', '')
-            # If Black captures a White rook
+        # Remove the old castling, en passant and turn keys
+        key = self.hash ^ en_passant_key(self) ^ TURN_KEY ^ CASTLING_KEYS[self.castling_rights]
+
+        self.pseudo_move(src, dest, piece, piece_type, promotion)
+
+        occupied = self.occupied
+        for square, old_piece in saved_squares:
+            new_piece = self.board_pieces[square]
+            key ^= PIECE_KEYS[old_piece][square] ^ PIECE_KEYS[new_piece][square]
+            if new_piece:
+                occupied |= 1 << square
             else:
-                if dest == 56: self.castling_rights = self.castling_rights.replace('Q', '')
-                if dest == 63: self.castling_rights = self.castling_rights.replace('K', '')
+                occupied &= ~(1 << square)
+        self.occupied = occupied
 
-        # Cleanup
-        if not self.castling_rights or self.castling_rights == '':
-            self.castling_rights = '-'
+        # Castling rights: moving the king or a rook, or capturing a rook, loses them
+        self.castling_rights &= CASTLING_MASK[src] & CASTLING_MASK[dest]
+
+        # Game phase: captured piece leaves, promoted piece arrives
+        self.phase -= PHASE_WEIGHTS[captured_piece & TYPE_MASK]
+        if promotion:
+            self.phase += PHASE_WEIGHTS[promotion[0] & TYPE_MASK]
 
         # Move counters
         self.fullmove_number += 1 if self.active_color == 'w' else 0
         self.halfmove_clock += 1
         if piece & TYPE_MASK == 1: # Pawn move
             self.halfmove_clock = 0
-        if self.board_pieces[dest] != 0: # Capture
+        if captured_piece != 0: # Capture
             self.halfmove_clock = 0
 
-        # En passant target square
-        if (piece & TYPE_MASK) == 1 and abs(dest - src) == 16: # Double pawn move
-            file = dest % 8
-            # Convert array row (0-7) to FEN rank (8-1)
-            # If white moved: dest is rank 4 (array row 4), EP target is rank 3 (array row 5)
-            # If black moved: dest is rank 5 (array row 3), EP target is rank 6 (array row 2)
-            
-            if self.active_color == 'w':
-                # White moved from rank 2 to 4 (row 6 to 4)
-                # EP target is rank 3 (row 5)
-                ep_rank = 3 
-            else: # active_color == 'b'
-                # Black moved from rank 7 to 5 (row 1 to 3)
-                # EP target is rank 6 (row 2)
-                ep_rank = 6
-
-            self.en_passant = chr(ord('a') + file) + str(ep_rank)
+        # En passant target square: the square the pawn skipped
+        if piece_type == 1 and abs(dest - src) == 16: # Double pawn move
+            self.en_passant = (src + dest) // 2
         else:
-            self.en_passant = '-'
+            self.en_passant = NO_SQUARE
 
         # Active color
         self.active_color = 'b' if self.active_color == 'w' else 'w'
 
-        # Update FEN
-        self.fen = self.generate_fen()
-        print(f"Updated FEN: {self.fen}")
+        # Add the new castling and en passant keys
+        self.hash = key ^ CASTLING_KEYS[self.castling_rights] ^ en_passant_key(self)
+
+    def make_null_move(self):
+        """Pass the turn (search only). Taken back with unmake_move."""
+        self.undo_stack.append((
+            [], self.castling_rights, self.en_passant,
+            self.halfmove_clock, self.fullmove_number, self.phase, self.hash
+        ))
+        self.history.append(self.hash)
+
+        # Pieces do not move, so the attack map stays valid
+        self.hash ^= en_passant_key(self) ^ TURN_KEY
+        self.en_passant = NO_SQUARE
+        self.active_color = 'b' if self.active_color == 'w' else 'w'
+        # Repetitions can not be claimed across a null move
+        self.halfmove_clock = 0
+
+    def unmake_move(self):
+        """Take back the last move played with make_move (or make_null_move)."""
+        saved_squares, castling_rights, en_passant, halfmove_clock, fullmove_number, phase, key = self.undo_stack.pop()
+        self.history.pop()
+        self.attack_cache = None
+
+        for square, piece in saved_squares:
+            self.board_pieces[square] = piece
+            if piece:
+                self.occupied |= 1 << square
+            else:
+                self.occupied &= ~(1 << square)
+        self.castling_rights = castling_rights
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.phase = phase
+        self.hash = key
+        self.active_color = 'b' if self.active_color == 'w' else 'w'
+
+    def is_repetition(self, count: int = 1) -> bool:
+        """True if the current position already occurred at least count times.
+
+        Only positions since the last capture or pawn move can repeat, so the
+        scan stops after halfmove_clock plies (same side to move: every 2 plies).
+        """
+        found = 0
+        last = min(self.halfmove_clock, len(self.history))
+        for ply in range(4, last + 1, 2):
+            if self.history[-ply] == self.hash:
+                found += 1
+                if found >= count:
+                    return True
+        return False
+
+    def is_fifty_move_draw(self) -> bool:
+        """Fifty moves by each side without a capture or pawn move (checkmate still wins)."""
+        return self.halfmove_clock >= 100
+
+    def is_check(self) -> bool:
+        """Is the side to move in check? Uses the attack map when it is already built."""
+        active = WHITE if self.active_color == 'w' else BLACK
+        king = self.board_pieces.index(6 + active) # ValueError without a king
+        if self.attack_cache is not None:
+            return self.attack_cache.is_attacked(king, active)
+        return self.is_square_attacked(king, active)
+
+    def is_insufficient_material(self) -> bool:
+        """Neither side can mate: bare kings, a single minor piece, or bishops on one square color."""
+        # A rook, queen or third minor piece (phase), or a fifth piece, rules it out without a scan
+        if self.phase > 2 or self.occupied.bit_count() > 4:
+            return False
+        pieces = [(square, self.board_pieces[square]) for square in range(64) if self.occupied >> square & 1]
+        name = material_name([piece for _, piece in pieces])
+        if name in INSUFFICIENT_MATERIAL:
+            return True
+        if set(name) <= set("KBv"): # Only bishops left: mate needs both square colors
+            colors = {(square // 8 + square % 8) % 2 for square, piece in pieces if piece & TYPE_MASK == 3}
+            return len(colors) == 1
+        return False
 
     def pseudo_move(self, src, dest, piece, piece_type, promotion):
         self.board_pieces[dest] = piece
@@ -144,16 +293,11 @@ class Board:
                     self.board_pieces[0] = 0
         
         # En Passant capture
-        if piece_type == 1:  # Pawn
-            if self.en_passant != '-':
-                file = ord(self.en_passant[0]) - ord('a')
-                rank = 8 - int(self.en_passant[1])
-                en_passant_index = rank * 8 + file
-                if dest == en_passant_index:
-                    if self.active_color == 'w':
-                        self.board_pieces[en_passant_index + 8] = 0  # Remove black pawn
-                    else:
-                        self.board_pieces[en_passant_index - 8] = 0  # Remove white pawn
+        if piece_type == 1 and dest == self.en_passant:
+            if self.active_color == 'w':
+                self.board_pieces[dest + 8] = 0  # Remove black pawn
+            else:
+                self.board_pieces[dest - 8] = 0  # Remove white pawn
 
     def generate_fen(self) -> str:
         fen_rows = []
@@ -168,76 +312,60 @@ class Board:
                     if empty_count > 0:
                         fen_row += str(empty_count)
                         empty_count = 0
-                    for symbol, value in self.piece_map.items():
-                        if value == piece:
-                            fen_row += symbol
-                            break
+                    fen_row += PIECE_SYMBOLS[piece]
             if empty_count > 0:
                 fen_row += str(empty_count)
             fen_rows.append(fen_row)
         board_fen = '/'.join(fen_rows)
-        fen = f"{board_fen} {self.active_color} {self.castling_rights} {self.en_passant} {self.halfmove_clock} {self.fullmove_number}"
+        fen = f"{board_fen} {self.active_color} {self.castling_fen()} {self.en_passant_fen()} {self.halfmove_clock} {self.fullmove_number}"
         return fen
     
+    def castling_fen(self) -> str:
+        return ''.join(letter for letter, bit in CASTLING_LETTERS.items() if self.castling_rights & bit) or '-'
+
+    def en_passant_fen(self) -> str:
+        return square_name(self.en_passant) if self.en_passant != NO_SQUARE else '-'
+
+    def attack_map(self) -> AttackMap:
+        """Attack counts of both sides for the current position, computed once per position.
+
+        Code that edits board_pieces directly (instead of make_move) must reset attack_cache.
+        """
+        if self.attack_cache is None:
+            self.attack_cache = AttackMap(self.board_pieces, self.occupied)
+        return self.attack_cache
+
+    def zobrist_key(self) -> int:
+        """Polyglot-compatible Zobrist key of the current position."""
+        return polyglot_key(self)
+
     def is_square_attacked(self, square: int, active_color: int) -> bool:
         enemy_color = BLACK if active_color == WHITE else WHITE
 
-        # 1. Sliding pieces (Rook, Bishop, Queen)
-        # Combined directions for optimization
-        directions = [
-            (-8, 'orthogonal'), (8, 'orthogonal'), (-1, 'orthogonal'), (1, 'orthogonal'), # Rook/Queen
-            (-9, 'diagonal'), (-7, 'diagonal'), (7, 'diagonal'), (9, 'diagonal')         # Bishop/Queen
-        ]
-
-        for d, d_type in directions:
-            current_index = square
-            while True:
-                prev_col = current_index % 8
-                current_index += d
-
-                if not (0 <= current_index < 64): break
-                if abs((current_index % 8) - prev_col) > 1: break # Correct edge wrap check
-
-                piece = self.board_pieces[current_index]
-                if piece != 0:
-                    if (piece & COLOR_MASK) == enemy_color:
-                        t = piece & TYPE_MASK
-                        if t == 5: return True # Queen
-                        if d_type == 'orthogonal' and t == 4: return True # Rook
-                        if d_type == 'diagonal' and t == 3: return True # Bishop
-                    break # Blocked by any piece
-
-        # 2. Knights
-        knight_moves = [-17, -15, -10, -6, 6, 10, 15, 17]
-        for m in knight_moves:
-            target = square + m
-            if 0 <= target < 64:
-                # Verify L-shape (prevents horizontal wrapping)
-                if abs((target % 8) - (square % 8)) <= 2 and \
-                abs((target // 8) - (square // 8)) <= 2 and \
-                abs((target % 8) - (square % 8)) + abs((target // 8) - (square // 8)) == 3:
+        # 1. Sliding pieces (Rook, Bishop, Queen): the first piece on each line
+        occupied = self.occupied
+        for lines, slider_types in ((ROOK_LINES, (4, 5)), (BISHOP_LINES, (3, 5))):
+            for mask, _, ends in lines[square]:
+                for target in ends[occupied & mask]:
                     piece = self.board_pieces[target]
-                    if (piece & COLOR_MASK) == enemy_color and (piece & TYPE_MASK) == 2:
+                    if (piece & COLOR_MASK) == enemy_color and (piece & TYPE_MASK) in slider_types:
                         return True
 
-        # 3. Pawns
-        # Pawns attack from the perspective of the king
-        pawn_offsets = [-7, -9] if active_color == WHITE else [7, 9]
-        for offset in pawn_offsets:
-            target = square + offset
-            if 0 <= target < 64 and abs((target % 8) - (square % 8)) == 1:
-                piece = self.board_pieces[target]
-                if (piece & COLOR_MASK) == enemy_color and (piece & TYPE_MASK) == 1:
-                    return True
+        # 2. Knights
+        board_pieces = self.board_pieces
+        for target in KNIGHT_TARGETS[square]:
+            if board_pieces[target] == 2 + enemy_color:
+                return True
+
+        # 3. Pawns: enemy pawns sit where our own pawn on square would attack
+        for target in PAWN_ATTACKS[active_color][square]:
+            if board_pieces[target] == 1 + enemy_color:
+                return True
 
         # 4. Enemy King (Kings cannot be adjacent)
-        king_offsets = [-9, -8, -7, -1, 1, 7, 8, 9]
-        for offset in king_offsets:
-            target = square + offset
-            if 0 <= target < 64 and abs((target % 8) - (square % 8)) <= 1:
-                piece = self.board_pieces[target]
-                if (piece & COLOR_MASK) == enemy_color and (piece & TYPE_MASK) == 6:
-                    return True
+        for target in KING_TARGETS[square]:
+            if board_pieces[target] == 6 + enemy_color:
+                return True
 
         return False
 
@@ -256,8 +384,8 @@ class Board:
         for row in range(8):
             result.append(' '.join(f"{self.board_pieces[row * 8 + col]:2}" for col in range(8)))
         result.append(f"Active color: {self.active_color}")
-        result.append(f"Castling rights: {self.castling_rights}")
-        result.append(f"En passant: {self.en_passant}")
+        result.append(f"Castling rights: {self.castling_fen()}")
+        result.append(f"En passant: {self.en_passant_fen()}")
         result.append(f"Halfmove clock: {self.halfmove_clock}")
         result.append(f"Fullmove number: {self.fullmove_number}")
 
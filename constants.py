@@ -2,4 +2,17 @@ WHITE = 8
 BLACK = 16
 
 TYPE_MASK = 0b00111  # 7
-COLOR_MASK = 0b11000 # 24 (WHITE | BLACK)
\ No newline at end of file
+COLOR_MASK = 0b11000 # 24 (WHITE | BLACK)
+MATE_SCORE = 100000
+
+# Castling rights bitmask
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+NO_SQUARE = -1 # No en passant square
+
+# Game phase: weight of each piece type (index = type), 24 with all pieces on the board
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0, 0]
+MAX_PHASE = 24
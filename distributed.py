@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import multiprocessing
+from collections import deque
+from board import Board
+from engine import Engine
+from match import load_openings
+from analysis_server import move_name, STARTING_POSITION
+
+UNIT_SIZE = 16 # Positions per work unit
+HEARTBEAT_INTERVAL = 2.0 # Seconds between two worker heartbeats
+HEARTBEAT_TIMEOUT = 10.0 # Silence after which a worker counts as lost
+CONNECT_RETRY = 30.0 # Seconds a worker keeps trying to reach the coordinator
+MAX_ATTEMPTS = 3 # Dispatches of a unit before its positions are reported as failed
+
+
+# Worker side
+
+def analyse_position(engine: Engine, index: int, fen: str, depth: int, time_limit: float) -> dict:
+    """Best line of one position, in the coordinator's output format."""
+    result = {"index": index, "fen": fen, "move": None, "score": None, "depth": 0, "nodes": 0, "pv": []}
+    try:
+        board = Board(fen)
+    except (ValueError, KeyError, IndexError) as e:
+        result["error"] = f"bad FEN: {e}"
+        return result
+
+    info = None
+    try:
+        for info in engine.analyse(board, depth = depth, time = time_limit):
+            pass
+    except Exception as e: # One broken position must not take the worker down
+        result["error"] = f"analysis failed: {type(e).__name__}: {e}"
+        return result
+    if info is not None:
+        line = info["lines"][0]
+        result.update(
+            move = move_name(line["move"]), score = line["score"], depth = info["depth"],
+            nodes = info["nodes"], pv = [move_name(move) for move in line["pv"]],
+        )
+    return result
+
+
+def run_worker(host: str, port: int, engine_options: dict = None, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+    """Connect to a coordinator and analyse the units it sends until it closes the connection."""
+    deadline = time.time() + CONNECT_RETRY
+    while True:
+        try:
+            connection = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+    engine = Engine(Board(STARTING_POSITION), **(engine_options or {}))
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(message: dict):
+        with send_lock:
+            connection.sendall((json.dumps(message) + "\n").encode())
+
+    # Heartbeats keep flowing while the main thread is busy searching
+    def heartbeat():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    threading.Thread(target = heartbeat, daemon = True).start()
+    try:
+        send({"type": "hello", "name": f"{socket.gethostname()}:{os.getpid()}"})
+        for line in connection.makefile("rb"):
+            message = json.loads(line)
+            if message["type"] != "unit":
+                continue
+            results = [
+                analyse_position(engine, index, fen, message["depth"], message["time"])
+                for index, fen in message["positions"]
+            ]
+            send({"type": "result", "unit": message["unit"], "results": results})
+    except (OSError, ValueError):
+        pass # Coordinator gone
+    finally:
+        stopped.set()
+        connection.close()
+
+
+# Coordinator side
+
+class Coordinator:
+    """Shards positions into work units and hands them to TCP workers.
+
+    Protocol (one JSON object per line): workers send "hello", then
+    "heartbeat" every few seconds and a "result" per unit; the coordinator
+    sends one "unit" at a time to each worker. A unit whose worker
+    disconnects or stays silent for heartbeat_timeout seconds goes back to
+    the queue. Results are written to output in input order as soon as
+    every earlier position is done.
+    """
+
+    def __init__(self, fens: list, output, depth: int = None, time_limit: float = None,
+                 unit_size: int = UNIT_SIZE, heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        if depth is None and time_limit is None:
+            raise ValueError("Analysis needs a depth or a time limit.")
+        self.fens = fens
+        self.output = output
+        self.depth = depth
+        self.time_limit = time_limit
+        self.heartbeat_timeout = heartbeat_timeout
+
+        positions = list(enumerate(fens))
+        self.units = [positions[start:start + unit_size] for start in range(0, len(positions), unit_size)]
+        self.pending = deque(range(len(self.units)))
+        self.attempts = [0] * len(self.units)
+        self.done_units = set()
+        self.results = {} # Position index -> result, until written
+        self.next_index = 0
+        self.redispatched = 0
+        self.unit_ready = None
+        self.finished = None
+        self.writers = set()
+
+    async def run(self, host: str = "127.0.0.1", port: int = 8766, local_workers: int = 0, engine_options: dict = None):
+        """Serve workers until every position is analysed; local_workers are started on this machine."""
+        self.unit_ready = asyncio.Condition()
+        self.finished = asyncio.Event()
+        if not self.units:
+            return
+        server = await asyncio.start_server(self._handle_worker, host, port)
+        port = server.sockets[0].getsockname()[1]
+        print(f"Coordinating {len(self.fens)} positions in {len(self.units)} units on {host}:{port}", file = sys.stderr)
+
+        processes = []
+        for _ in range(local_workers):
+            process = multiprocessing.Process(target = run_worker, args = (host, port, engine_options), daemon = True)
+            process.start()
+            processes.append(process)
+
+        try:
+            await self.finished.wait()
+        finally:
+            # Closing the connections tells the workers to exit
+            server.close()
+            for writer in self.writers:
+                writer.close()
+            for process in processes:
+                await asyncio.to_thread(process.join, 5)
+                if process.is_alive():
+                    process.terminate()
+
+    async def _next_unit(self):
+        """Unit id to hand out, waiting while others are still in flight; None when all are done."""
+        async with self.unit_ready:
+            while not self.pending and not self.finished.is_set():
+                await self.unit_ready.wait()
+            return None if self.finished.is_set() else self.pending.popleft()
+
+    async def _requeue(self, unit: int):
+        if unit in self.done_units:
+            return
+        if self.attempts[unit] >= MAX_ATTEMPTS:
+            # Probably a position that kills workers: give up on the unit
+            error = f"unit lost {MAX_ATTEMPTS} times"
+            await self._complete(unit, [{"index": index, "fen": fen, "error": error} for index, fen in self.units[unit]])
+        else:
+            self.redispatched += 1
+            async with self.unit_ready:
+                self.pending.appendleft(unit)
+                self.unit_ready.notify()
+
+    async def _handle_worker(self, reader, writer):
+        name = writer.get_extra_info("peername")
+        self.writers.add(writer)
+        unit = None
+        try:
+            while True:
+                unit = await self._next_unit()
+                if unit is None:
+                    return
+                self.attempts[unit] += 1
+                message = {"type": "unit", "unit": unit, "positions": self.units[unit], "depth": self.depth, "time": self.time_limit}
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+
+                # Wait for the result; any message (heartbeats too) proves the worker is alive
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.heartbeat_timeout)
+                    if not line:
+                        raise ConnectionError("worker disconnected")
+                    message = json.loads(line)
+                    if message["type"] == "hello":
+                        name = message["name"]
+                    elif message["type"] == "result" and message["unit"] == unit:
+                        break
+                await self._complete(unit, message["results"])
+                unit = None
+        except (asyncio.TimeoutError, ConnectionError, ValueError, KeyError) as e:
+            if unit is not None:
+                print(f"Worker {name} lost ({type(e).__name__}), unit {unit} goes back to the queue", file = sys.stderr)
+                await self._requeue(unit)
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _complete(self, unit: int, results: list):
+        if unit in self.done_units:
+            return # Late answer from a worker we gave up on
+        self.done_units.add(unit)
+        for result in results:
+            self.results[result["index"]] = result
+
+        # Write every result whose predecessors are all written
+        while self.next_index in self.results:
+            self.output.write(json.dumps(self.results.pop(self.next_index)) + "\n")
+            self.next_index += 1
+        self.output.flush()
+
+        if len(self.done_units) == len(self.units):
+            async with self.unit_ready:
+                self.finished.set()
+                self.unit_ready.notify_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Distributed batch analysis over TCP.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    coordinator_parser = commands.add_parser("coordinator", help = "shard a FEN/EPD file and collect the results")
+    coordinator_parser.add_argument("input", help = "FEN/EPD file, one position per line")
+    coordinator_parser.add_argument("--output", help = "line-JSON results in input order (default: stdout)")
+    coordinator_parser.add_argument("--host", default = "127.0.0.1")
+    coordinator_parser.add_argument("--port", type = int, default = 8766)
+    coordinator_parser.add_argument("--depth", type = int, default = None)
+    coordinator_parser.add_argument("--time", type = float, default = None, help = "seconds per position")
+    coordinator_parser.add_argument("--unit-size", type = int, default = UNIT_SIZE)
+    coordinator_parser.add_argument("--heartbeat-timeout", type = float, default = HEARTBEAT_TIMEOUT)
+    coordinator_parser.add_argument("--local-workers", type = int, default = 0, help = "worker processes to start on this machine")
+
+    worker_parser = commands.add_parser("worker", help = "analyse units from a coordinator")
+    worker_parser.add_argument("--host", default = "127.0.0.1")
+    worker_parser.add_argument("--port", type = int, default = 8766)
+    worker_parser.add_argument("--processes", type = int, default = 1)
+
+    for command_parser in (coordinator_parser, worker_parser):
+        command_parser.add_argument("--tablebases", help = "tablebase directory for the engines")
+        command_parser.add_argument("--cache", help = "persistent analysis cache (SQLite file) for the engines")
+    args = parser.parse_args()
+
+    options = {}
+    if args.tablebases:
+        options["tablebase_path"] = args.tablebases
+    if args.cache:
+        options["analysis_cache_path"] = args.cache
+
+    if args.command == "worker":
+        workers = [multiprocessing.Process(target = run_worker, args = (args.host, args.port, options)) for _ in range(args.processes)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+    else:
+        depth = args.depth if args.depth is not None or args.time is not None else 4
+        output = open(args.output, "w") if args.output else sys.stdout
+        coordinator = Coordinator(load_openings(args.input), output, depth, args.time, args.unit_size, args.heartbeat_timeout)
+        start_time = time.time()
+        try:
+            asyncio.run(coordinator.run(args.host, args.port, args.local_workers, options))
+        finally:
+            if args.output:
+                output.close()
+        print(f"Analysed {coordinator.next_index} positions in {time.time() - start_time:.1f} seconds "
+              f"({coordinator.redispatched} units re-dispatched)", file = sys.stderr)
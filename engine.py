@@ -1,32 +1,498 @@
+import hashlib
+import json
+import os
 from board import Board
 from random import randint
+from time import perf_counter
 from move import Move
 from evaluator import Evaluator
-from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK
+from polyglot import OpeningBook
+from tablebase import Tablebase, MIN_MATE_SCORE
+from eval_cache import EvalCache
+from analysis_cache import AnalysisCache
+from mate_solver import MateSolver
+from attack_map import find_checkers, find_pins, check_block_squares, SLIDER_LINES, DIRECTION, RAYS
+from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK, MATE_SCORE, NO_SQUARE
+from constants import WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE
+
+INFINITY = MATE_SCORE + 1
+STOP_CHECK_NODES = 512 # Look at the clock / stop flag every this many nodes
+MAX_PLY = 64
+
+# Selective search parameters
+NULL_MOVE_REDUCTION = 2
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3 # Moves searched at full depth before reducing
+FUTILITY_MARGIN = 200 # Centipawns per remaining ply
+ASPIRATION_WINDOW = 50 # Initial half-width around the previous iteration's score
+
+class SearchStopped(Exception):
+    """Raised inside the search when the time is up or stop() was called."""
+
 
 class Engine:
-    def __init__(self, board: Board):
+    def __init__(self, board: Board, depth: int = 2, book_path: str = None, book_selection: str = "weighted", tablebase_path: str = None,
+                 eval_cache_size: int = 1 << 16, null_move: bool = True, lmr: bool = True, futility: bool = True,
+                 check_extensions: bool = True, pvs: bool = True, aspiration: bool = True, eval_parameters_path: str = None,
+                 analysis_cache_path: str = None):
         self.board = board
-        self.evaluator = Evaluator()
+        self.depth = depth
+        self.nodes = 0
+
+        # Selective search features, each one can be switched off
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        self.check_extensions = check_extensions
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.stats = {}
+
+        # Triangular PV table: pv_table[ply] is the best line found from ply on
+        self.pv_table = [[] for _ in range(2 * MAX_PLY + 2)]
+        self.pv = []
+
+        # Analysis limits
+        self.deadline = None
+        self.stop_requested = False
+
+        self.eval_cache = EvalCache(eval_cache_size)
+        self.book = OpeningBook(book_path, book_selection) if book_path else None
+        self.tablebase = Tablebase(tablebase_path) if tablebase_path else None
+        self.evaluator = Evaluator(tablebase = self.tablebase, parameters_path = eval_parameters_path)
+        self.analysis_cache = AnalysisCache(analysis_cache_path, self.config_fingerprint()) if analysis_cache_path else None
+
+    def config_fingerprint(self) -> str:
+        """Digest of everything besides the position that changes search results.
+
+        Engines sharing an analysis cache only see results of their own
+        configuration: evaluation parameters, tablebase files and search switches.
+        """
+        tablebase_files = None
+        if self.tablebase is not None and os.path.isdir(self.tablebase.directory):
+            tablebase_files = sorted(name for name in os.listdir(self.tablebase.directory) if name.endswith(".tb"))
+        config = {
+            "parameters": self.evaluator.parameters,
+            "tablebases": tablebase_files,
+            "switches": [self.null_move, self.lmr, self.futility, self.check_extensions, self.pvs, self.aspiration],
+        }
+        return hashlib.sha1(json.dumps(config, sort_keys = True).encode()).hexdigest()[:16]
 
     def engine_move(self):
-        legal_moves = self.search(0)
+        legal_moves = self.find_legal_moves()
         if not legal_moves:
             return None
 
-        # Random move for now
-        random_index = randint(0, len(legal_moves) - 1)
-        move = legal_moves[random_index]
+        # Opening book first: no search needed for known positions
+        if self.book is not None:
+            move = self.book.choose_move(self.board, legal_moves)
+            if move is not None:
+                print(f"Engine selected book move: {move[0]} to {move[1]}")
+                return move
+
+        # Tablebase endings: exact best move without searching
+        if self.tablebase is not None:
+            move = self.tablebase.best_move(self.board, legal_moves)
+            if move is not None:
+                print(f"Engine selected tablebase move: {move[0]} to {move[1]}")
+                return move
+
+        if self.depth == 0:
+            # Random move
+            random_index = randint(0, len(legal_moves) - 1)
+            move = legal_moves[random_index]
+        else:
+            score, move = self.search(self.depth)
+            cache = self.eval_cache.stats()
+            print(f"Search depth {self.depth}: score {score}, {self.nodes} nodes, eval cache hit rate {cache['hit_rate']:.2f}")
+            print("PV: " + " ".join(f"{m[0]}-{m[1]}" for m in self.pv))
+            print("Pruning: " + ", ".join(f"{name} {count}" for name, count in self.stats.items() if name != "nodes"))
         print(f"Engine selected move: {move[0]} to {move[1]}")
         return move
     
     def evaluate(self) -> int:
-        return self.evaluator.evaluate(self.board)
+        return self.evaluator.evaluate(self.board, verbose = True)
+
+    def evaluate_position(self, ply: int = 0) -> int:
+        """Quiet evaluation (white positive) through the eval cache.
+
+        Tablebase mates are moved ply plies further away, onto the same
+        scale as search mates (MATE_SCORE - plies from the root).
+        """
+        key = self.board.hash
+        score = self.eval_cache.probe(key)
+        if score is None:
+            score = self.evaluator.evaluate(self.board)
+            self.eval_cache.store(key, score)
+        if score >= MIN_MATE_SCORE:
+            return score - ply
+        if score <= -MIN_MATE_SCORE:
+            return score + ply
+        return score
+
+    def search(self, depth: int):
+        """Iterative deepening alpha-beta search, returns (score, best move); the line is in self.pv."""
+        self._reset_search()
+
+        cached = self._probe_analysis_cache(depth)
+        if cached is not None:
+            self.pv = cached["pv"]
+            return cached["score"], cached["move"]
+
+        undo_depth = len(self.board.undo_stack)
+        score, move, completed_depth = 0, None, 0
+        for current_depth in range(1, depth + 1):
+            try:
+                score, move = self.aspiration_search(current_depth, score)
+            except SearchStopped:
+                # stop() was called: take back the interrupted line, keep the last finished depth
+                while len(self.board.undo_stack) > undo_depth:
+                    self.board.unmake_move()
+                break
+            self.pv = self.pv_table[0]
+            completed_depth = current_depth
+
+        self.stats["nodes"] = self.nodes
+        if self.analysis_cache is not None and move is not None:
+            self.analysis_cache.store(self.board.hash, completed_depth, score, move, self.pv)
+        return score, move
+
+    def analyse(self, board: Board = None, depth: int = None, time: float = None, multipv: int = 1):
+        """Analyse a position, yielding the best multipv lines after every completed depth.
+
+        Each result is a dict with depth, nodes, seconds and lines (move, score, pv),
+        best first. Stops at depth, after time seconds or when stop() is called;
+        closing the generator (or breaking out of the loop) also stops it.
+        A board passed in is analysed instead of the engine's own board, which
+        is restored once the generator finishes.
+        """
+        if depth is None and time is None:
+            raise ValueError("Analysis needs a depth or a time limit.")
+        own_board = self.board
+        if board is not None:
+            self.board = board
+        try:
+            yield from self._analyse(depth, time, multipv)
+        finally:
+            self.board = own_board
+
+    def _analyse(self, depth: int, time: float, multipv: int):
+        """analyse on self.board."""
+        self._reset_search()
+        start_time = perf_counter()
+        self.deadline = start_time + time if time is not None else None
+        root_moves = self.order_moves(self.find_legal_moves())
+        if not root_moves:
+            return
+
+        # A deep enough stored result answers a fixed depth, single line analysis
+        if depth is not None and multipv == 1:
+            cached = self._probe_analysis_cache(depth)
+            if cached is not None:
+                self.pv = cached["pv"]
+                line = {"move": cached["move"], "score": cached["score"], "pv": cached["pv"]}
+                yield {"depth": cached["depth"], "nodes": 0, "seconds": perf_counter() - start_time, "nps": 0.0, "lines": [line]}
+                return
+
+        undo_depth = len(self.board.undo_stack)
+        lines, completed_depth = None, 0
+        try:
+            for current_depth in range(1, (depth or MAX_PLY) + 1):
+                try:
+                    lines = self._search_root_lines(current_depth, multipv, root_moves)
+                except SearchStopped:
+                    # Take back the moves of the interrupted line
+                    while len(self.board.undo_stack) > undo_depth:
+                        self.board.unmake_move()
+                    break
+
+                # Next iteration: best lines first, the rest in the previous order
+                best = [line["move"] for line in lines]
+                root_moves = best + [move for move in root_moves if move not in best]
+                self.pv = lines[0]["pv"]
+                self.stats["nodes"] = self.nodes
+                completed_depth = current_depth
+
+                seconds = perf_counter() - start_time
+                yield {
+                    "depth": current_depth,
+                    "nodes": self.nodes,
+                    "seconds": seconds,
+                    "nps": self.nodes / seconds if seconds else 0.0,
+                    "lines": lines,
+                }
+        finally:
+            self.deadline = None
+            # The best line of the deepest finished iteration is exact, whatever multipv was
+            if self.analysis_cache is not None and completed_depth:
+                best = lines[0]
+                self.analysis_cache.store(self.board.hash, completed_depth, best["score"], best["move"], best["pv"])
+
+    def find_mate(self, max_plies: int, table_size: int = 1 << 18, checks_only: bool = False, max_nodes: int = None):
+        """Shortest forced mate by the side to move within max_plies plies, by proof-number search.
+
+        Returns the mating line (both sides' moves, the last one mates) or None;
+        the line is also left in self.pv and the solver's node count in self.nodes.
+        """
+        solver = MateSolver(self, table_size, checks_only, max_nodes)
+        line = solver.solve(max_plies)
+        self.nodes = solver.nodes
+        self.pv = line or []
+        return line
+
+    def stop(self):
+        """Ask a running analysis to stop (safe to call from another thread)."""
+        self.stop_requested = True
+
+    def _search_root_lines(self, depth: int, multipv: int, root_moves: list) -> list:
+        """Root search keeping the best multipv moves exact: later moves only need to beat the K-th line."""
+        board = self.board
+        lines = []
+        for move in root_moves:
+            bound = lines[multipv - 1]["score"] if len(lines) >= multipv else -INFINITY
+            board.make_move(move)
+            if bound == -INFINITY:
+                score = -self.negamax(depth - 1, -INFINITY, INFINITY, 1)[0]
+            else:
+                score = -self.negamax(depth - 1, -bound - 1, -bound, 1)[0]
+                if score > bound:
+                    score = -self.negamax(depth - 1, -INFINITY, -bound, 1)[0]
+            board.unmake_move()
+
+            if score > bound:
+                lines.append({"move": move, "score": score, "pv": [move] + self.pv_table[1]})
+                lines.sort(key = lambda line: line["score"], reverse = True)
+                del lines[multipv:]
+        return lines
+
+    def _probe_analysis_cache(self, depth: int):
+        """Stored result of the current position searched at least depth plies, if its move is legal here."""
+        if self.analysis_cache is None:
+            return None
+        cached = self.analysis_cache.probe(self.board.hash, depth)
+        if cached is None or cached["move"] not in self.find_legal_moves():
+            return None # Missing, or a hash collision
+        return cached
+
+    def _reset_search(self):
+        self.nodes = 0
+        self.stop_requested = False
+        self.stats = {
+            "nodes": 0,
+            "check_extensions": 0,
+            "reverse_futility_cutoffs": 0,
+            "null_move_tries": 0,
+            "null_move_cutoffs": 0,
+            "futility_pruned": 0,
+            "lmr_reductions": 0,
+            "lmr_researches": 0,
+            "pvs_researches": 0,
+            "aspiration_researches": 0,
+        }
+        self.pv = []
+
+    def aspiration_search(self, depth: int, previous_score: int):
+        """Search the root in a narrow window around the last score, widening on failure."""
+        if not self.aspiration or depth == 1 or abs(previous_score) >= MATE_SCORE - MAX_PLY:
+            return self.negamax(depth, -INFINITY, INFINITY, 0)
+
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous_score - delta, previous_score + delta
+        while True:
+            score, move = self.negamax(depth, alpha, beta, 0)
+            if alpha < score < beta or (alpha == -INFINITY and beta == INFINITY):
+                return score, move
+
+            self.stats["aspiration_researches"] += 1
+            delta *= 4
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITY)
+            else:
+                beta = min(score + delta, INFINITY)
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply: int, allow_null: bool = True):
+        """Score from the side to move's point of view and the best move found."""
+        self.nodes += 1
+        board = self.board
+        stats = self.stats
+        self.pv_table[ply] = []
+
+        if self.nodes % STOP_CHECK_NODES == 0 and (self.stop_requested or (self.deadline is not None and perf_counter() > self.deadline)):
+            raise SearchStopped()
+
+        # Draw by repetition: no need to search the branch again
+        if ply > 0 and board.is_repetition():
+            return 0, None
+
+        # Fifty-move rule (unless it is checkmate right now)
+        if ply > 0 and board.is_fifty_move_draw():
+            if self.is_check() and not self.has_any_legal_move():
+                return -MATE_SCORE + ply, None
+            return 0, None
+
+        # Dead position: no mate is possible for either side
+        if ply > 0 and board.is_insufficient_material():
+            return 0, None
+
+        in_check = self.is_check()
+
+        # Check extension: do not let a check push the real threat past the horizon
+        if in_check and self.check_extensions and ply < MAX_PLY:
+            depth += 1
+            stats["check_extensions"] += 1
+
+        if depth <= 0:
+            score = self.evaluate_position(ply)
+            return (score if board.active_color == 'w' else -score), None
 
-    def search(self, depth: int = 0):
         legal_moves = self.find_legal_moves()
-        return legal_moves
-        # Placeholder for search algorithm implementation
+        if not legal_moves:
+            if in_check:
+                return -MATE_SCORE + ply, None # Checkmated
+            return 0, None # Stalemate
+
+        static_eval = None
+        if ply > 0 and not in_check and abs(beta) < MATE_SCORE - MAX_PLY:
+            static_eval = self.evaluate_position(ply)
+            if board.active_color == 'b':
+                static_eval = -static_eval
+
+            # Reverse futility: far above beta near the leaves, the opponent will not allow this
+            if self.futility and depth <= 2 and static_eval - FUTILITY_MARGIN * depth >= beta:
+                stats["reverse_futility_cutoffs"] += 1
+                return static_eval, None
+
+            # Null move: if passing still fails high, a real move will too.
+            # Not in pawn endings, where zugzwang makes passing a good move.
+            if (self.null_move and allow_null and depth > NULL_MOVE_REDUCTION and static_eval >= beta
+                    and self._non_pawn_material() >= self.evaluator.piece_values[2]):
+                stats["null_move_tries"] += 1
+                board.make_null_move()
+                score = -self.negamax(depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)[0]
+                board.unmake_move()
+                if score >= beta:
+                    stats["null_move_cutoffs"] += 1
+                    return beta, None
+
+        # Futility: at frontier nodes quiet moves can not lift a hopeless score to alpha
+        futile = self.futility and depth == 1 and static_eval is not None and static_eval + FUTILITY_MARGIN <= alpha
+
+        ordered_moves = self.order_moves(legal_moves)
+        # Principal variation move of the previous iteration first
+        if ply < len(self.pv) and self.pv[ply] in ordered_moves:
+            ordered_moves.remove(self.pv[ply])
+            ordered_moves.insert(0, self.pv[ply])
+
+        best_score, best_move = -INFINITY, None
+        for i, move in enumerate(ordered_moves):
+            quiet = len(move) == 2 and board.board_pieces[move[1]] == 0
+            board.make_move(move)
+            gives_check = self.is_check()
+
+            if futile and quiet and not gives_check and best_move is not None:
+                board.unmake_move()
+                stats["futility_pruned"] += 1
+                continue
+
+            if i == 0:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            else:
+                full_depth = True
+                # Late move reductions: quiet moves late in the ordering are searched shallower first
+                if self.lmr and depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES and quiet and not in_check and not gives_check:
+                    stats["lmr_reductions"] += 1
+                    score = -self.negamax(depth - 2, -alpha - 1, -alpha, ply + 1)[0]
+                    full_depth = score > alpha
+                    if full_depth:
+                        stats["lmr_researches"] += 1
+
+                if full_depth:
+                    if self.pvs:
+                        # Principal variation search: prove the move is no better than alpha
+                        # with a null window, search it properly only if that fails
+                        score = -self.negamax(depth - 1, -alpha - 1, -alpha, ply + 1)[0]
+                        if alpha < score < beta:
+                            stats["pvs_researches"] += 1
+                            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+                    else:
+                        score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            board.unmake_move()
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+            if alpha >= beta:
+                break
+
+        return best_score, best_move
+
+    def order_moves(self, legal_moves: list) -> list:
+        """Promotions and captures first (most valuable victim, least valuable attacker), then quiet moves."""
+        board_pieces = self.board.board_pieces
+        values = self.evaluator.piece_values
+
+        def move_order(move):
+            victim = board_pieces[move[1]]
+            score = 0
+            if victim != 0:
+                score += 10 * values[victim & TYPE_MASK] - values[board_pieces[move[0]] & TYPE_MASK] + 10000
+            if len(move) > 2:
+                score += values[move[2] & TYPE_MASK] + 10000
+            return score
+
+        return sorted(legal_moves, key = move_order, reverse = True)
+
+    def _non_pawn_material(self) -> int:
+        """Material of the side to move without pawns and king (zugzwang guard)."""
+        active = WHITE if self.board.active_color == 'w' else BLACK
+        values = self.evaluator.piece_values
+        return sum(values[piece & TYPE_MASK] for piece in self.board.board_pieces
+                   if piece != 0 and (piece & COLOR_MASK) == active and (piece & TYPE_MASK) != 1)
+
+    def is_check(self) -> bool:
+        return self.board.is_check()
+
+    def has_any_legal_move(self) -> bool:
+        """Like bool(find_legal_moves()), but stops at the first legal move found."""
+        self.active = WHITE if self.board.active_color == 'w' else BLACK
+        return next(self._legal_moves(self._pseudo_legal_moves_by_piece()), None) is not None
+
+    def outcome(self):
+        """(result, termination) if the game is over, e.g. ("1-0", "checkmate"), else None."""
+        board = self.board
+        if not self.has_any_legal_move():
+            if self.is_check():
+                return ("0-1" if board.active_color == 'w' else "1-0"), "checkmate"
+            return "1/2-1/2", "stalemate"
+        if board.is_insufficient_material():
+            return "1/2-1/2", "insufficient material"
+        if board.is_repetition(2):
+            return "1/2-1/2", "threefold repetition"
+        if board.is_fifty_move_draw():
+            return "1/2-1/2", "fifty-move rule"
+        return None
+
+    def _pseudo_legal_moves_by_piece(self):
+        """Pseudo-legal moves generated one piece at a time, king first (it is the only piece that can answer every check)."""
+        board_pieces = self.board.board_pieces
+        king_idx = self._find_king_position(self.active)
+        moves = []
+        self._find_king_moves(king_idx, moves)
+        yield from moves
+        for i, piece in enumerate(board_pieces):
+            if piece == 0 or (piece & COLOR_MASK) != self.active:
+                continue
+            moves = []
+            match piece & TYPE_MASK:
+                case 3 | 4 | 5:
+                    self._find_sliding_moves(i, piece & TYPE_MASK, moves)
+                case 1:
+                    self._find_pawn_moves(i, moves)
+                case 2:
+                    self._find_knight_moves(i, moves)
+            yield from moves
 
     def find_legal_moves(self) -> list:
         psuedo_legal_moves = []
@@ -37,12 +503,8 @@ class Engine:
             piece_type = piece & TYPE_MASK
             # print(piece_type, piece)
             match piece_type:
-                case 3: # Bishop
-                    self._find_sliding_moves(i, [-9, -7, 7, 9], psuedo_legal_moves)
-                case 4: # Rook
-                    self._find_sliding_moves(i, [-8, -1, 1, 8], psuedo_legal_moves)
-                case 5: # Queen
-                    self._find_sliding_moves(i, [-9, -8, -7, -1, 1, 7, 8, 9], psuedo_legal_moves)
+                case 3 | 4 | 5: # Bishop, Rook, Queen
+                    self._find_sliding_moves(i, piece_type, psuedo_legal_moves)
                 case 1: # Pawn
                     self._find_pawn_moves(i, psuedo_legal_moves)
                 case 2: # Knight
@@ -55,64 +517,85 @@ class Engine:
         return legal_moves
 
     def filter_legal_moves(self, pseudo_legal_moves: list) -> list:
-        real_legal_moves = []
-        
+        return list(self._legal_moves(pseudo_legal_moves))
+
+    def _legal_moves(self, pseudo_legal_moves):
+        """Yield the legal moves among pseudo_legal_moves (any iterable, consumed lazily)."""
+        board_pieces = self.board.board_pieces
+        attack_map = self.board.attack_map()
+        enemy_color = BLACK if self.active == WHITE else WHITE
+        enemy_attacks = attack_map.counts[enemy_color]
+
+        king_idx = self._find_king_position(self.active)
+        checkers = find_checkers(board_pieces, king_idx, self.active, self.board.occupied)
+        pins = find_pins(board_pieces, king_idx, self.active, self.board.occupied)
+
+        # The king can not step back along the line of a sliding checker
+        # (that square is only "attacked" through the king itself)
+        king_forbidden = set()
+        block_squares = None
+        for checker in checkers:
+            d = DIRECTION[checker][king_idx]
+            if d != 0 and (board_pieces[checker] & TYPE_MASK) in [3, 4, 5]:
+                behind = RAYS[king_idx][d]
+                if behind:
+                    king_forbidden.add(behind[0])
+        if len(checkers) == 1:
+            block_squares = check_block_squares(king_idx, checkers[0])
+
         for move in pseudo_legal_moves:
-            from_idx, to_idx, *promotion = move
-            
-            # 1. Save state for manual "unmake" later
-            original_src_piece = self.board.board_pieces[from_idx]
-            original_dest_piece = self.board.board_pieces[to_idx]
-            
-            # 2. Simulate move
-            self.board.board_pieces[to_idx] = original_src_piece
-            self.board.board_pieces[from_idx] = 0
-            
-            # 3. Verify king safety
-            # Note: Must find king AFTER simulation if the king itself moved
-            king_idx = self._find_king_position(self.active)
-            
-            if not self.board.is_square_attacked(king_idx, self.active):
-                real_legal_moves.append(move)
-                
-            # 4. Unmake move (Restore state)
-            self.board.board_pieces[from_idx] = original_src_piece
-            self.board.board_pieces[to_idx] = original_dest_piece
-            
-        return real_legal_moves
+            from_idx, to_idx = move[0], move[1]
 
-    def _find_sliding_moves(self, index: int, directions: list, moves: list):
-        friendly_color = self.board.board_pieces[index] & COLOR_MASK
+            # 1. King moves: destination must not be attacked
+            if from_idx == king_idx:
+                if enemy_attacks[to_idx] == 0 and to_idx not in king_forbidden:
+                    yield move
+                continue
 
-        for direction in directions:
-            current_index = index
-            while True:
-                # Calculate previous coordinates for wrapping check
-                prev_col = current_index % 8
-                
-                current_index += direction
-                
-                # 1. Check for out-of-bounds
-                if not (0 <= current_index < 64):
-                    break
-                
-                # 2. Check for wrapping
-                curr_row = current_index // 8
-                curr_col = current_index % 8
-                
-                if abs(curr_col - prev_col) > 2: 
-                    break
+            # 2. En passant removes a second piece: verify by simulation
+            if (board_pieces[from_idx] & TYPE_MASK) == 1 and board_pieces[to_idx] == 0 and (to_idx - from_idx) % 8 != 0:
+                if self._is_legal_en_passant(from_idx, to_idx, king_idx):
+                    yield move
+                continue
 
-                target_piece = self.board.board_pieces[current_index]
-                
-                if target_piece == 0:
-                    moves.append(Move(index, current_index))
-                else:
-                    # Add move only if capturing an enemy piece
-                    if (target_piece & COLOR_MASK) != friendly_color:
-                        moves.append(Move(index, current_index))
-                    # Stop scanning (both friendly and enemy pieces)
-                    break
+            # 3. Double check: only the king can move
+            if len(checkers) > 1:
+                continue
+
+            # 4. Single check: capture the checker or block the line
+            if block_squares is not None and to_idx not in block_squares:
+                continue
+
+            # 5. Pinned pieces stay on the pin line
+            if from_idx in pins and to_idx not in pins[from_idx]:
+                continue
+
+            yield move
+
+    def _is_legal_en_passant(self, from_idx: int, to_idx: int, king_idx: int) -> bool:
+        board_pieces = self.board.board_pieces
+        victim_idx = to_idx + 8 if self.active == WHITE else to_idx - 8
+        pawn, victim = board_pieces[from_idx], board_pieces[victim_idx]
+
+        occupied = self.board.occupied
+        board_pieces[to_idx], board_pieces[from_idx], board_pieces[victim_idx] = pawn, 0, 0
+        self.board.occupied = (occupied | (1 << to_idx)) & ~(1 << from_idx) & ~(1 << victim_idx)
+        legal = not self.board.is_square_attacked(king_idx, self.active)
+        board_pieces[to_idx], board_pieces[from_idx], board_pieces[victim_idx] = 0, pawn, victim
+        self.board.occupied = occupied
+        return legal
+
+    def _find_sliding_moves(self, index: int, piece_type: int, moves: list):
+        board_pieces = self.board.board_pieces
+        friendly_color = board_pieces[index] & COLOR_MASK
+
+        # Attacked squares of every line in one lookup, minus our own pieces
+        occupied = self.board.occupied
+        for mask, targets, _ in SLIDER_LINES[piece_type][index]:
+            for target_index in targets[occupied & mask]:
+                target_piece = board_pieces[target_index]
+                if target_piece == 0 or (target_piece & COLOR_MASK) != friendly_color:
+                    moves.append(Move(index, target_index))
 
     def _find_pawn_moves(self, index: int, moves: list):
         friendly_color = self.board.board_pieces[index] & COLOR_MASK
@@ -150,13 +633,10 @@ class Engine:
                         add_move(index, capture_index)
                     
         # 3. En Passant
-        if self.board.en_passant != '-':
-            ep_file = ord(self.board.en_passant[0]) - ord('a')
-            ep_rank = 8 - int(self.board.en_passant[1])
-            ep_index = ep_rank * 8 + ep_file
-            
+        ep_index = self.board.en_passant
+        if ep_index != NO_SQUARE:
             # En Passant is only possible if the target square is diagonally adjacent
-            if abs(ep_file - curr_col) == 1 and (index // 8 + (direction // 8)) == ep_rank:
+            if abs(ep_index % 8 - curr_col) == 1 and (index // 8 + (direction // 8)) == ep_index // 8:
                 moves.append(Move(index, ep_index))
             
     def _find_knight_moves(self, index: int, moves: list):
@@ -197,38 +677,42 @@ class Engine:
                         moves.append(Move(index, target_index))
         
         # Castling
-        if self.board.is_square_attacked(index, friendly_color):
+        castling_rights = self.board.castling_rights
+        if not castling_rights:
+            return
+        attack_map = self.board.attack_map()
+        if attack_map.is_attacked(index, friendly_color):
             return # Cannot castle out of check
         
         if friendly_color == WHITE:
-            if 'K' in self.board.castling_rights:
+            if castling_rights & WHITE_KINGSIDE:
                 if (self.board.board_pieces[61] == 0 and 
                     self.board.board_pieces[62] == 0 and
-                    not self.board.is_square_attacked(61, friendly_color) and
-                    not self.board.is_square_attacked(62, friendly_color)):
+                    not attack_map.is_attacked(61, friendly_color) and
+                    not attack_map.is_attacked(62, friendly_color)):
                     moves.append(Move(60, 62))
-            if 'Q' in self.board.castling_rights:
+            if castling_rights & WHITE_QUEENSIDE:
                 if (self.board.board_pieces[59] == 0 and 
                     self.board.board_pieces[58] == 0 and
                     self.board.board_pieces[57] == 0 and
-                    not self.board.is_square_attacked(59, friendly_color) and
-                    not self.board.is_square_attacked(58, friendly_color)):
+                    not attack_map.is_attacked(59, friendly_color) and
+                    not attack_map.is_attacked(58, friendly_color)):
 
                     moves.append(Move(60, 58))
             
         if friendly_color == BLACK:
-            if 'k' in self.board.castling_rights:
+            if castling_rights & BLACK_KINGSIDE:
                 if (self.board.board_pieces[5] == 0 and 
                     self.board.board_pieces[6] == 0 and
-                    not self.board.is_square_attacked(5, friendly_color) and
-                    not self.board.is_square_attacked(6, friendly_color)):
+                    not attack_map.is_attacked(5, friendly_color) and
+                    not attack_map.is_attacked(6, friendly_color)):
                     moves.append(Move(4, 6))
-            if 'q' in self.board.castling_rights:
+            if castling_rights & BLACK_QUEENSIDE:
                 if (self.board.board_pieces[3] == 0 and 
                     self.board.board_pieces[2] == 0 and
                     self.board.board_pieces[1] == 0 and
-                    not self.board.is_square_attacked(3, friendly_color) and
-                    not self.board.is_square_attacked(2, friendly_color)):
+                    not attack_map.is_attacked(3, friendly_color) and
+                    not attack_map.is_attacked(2, friendly_color)):
                     moves.append(Move(4, 2))
 
     def _find_king_position(self, active_color: int) -> int:
@@ -0,0 +1,44 @@
+class EvalCache:
+    """Fixed-size evaluation cache (position hash -> score), always-replace.
+
+    Slots are picked by the low bits of the hash and the full hash is kept to
+    detect collisions, so memory use never grows past the chosen size.
+    """
+
+    def __init__(self, size: int = 1 << 16):
+        if size <= 0 or size & (size - 1):
+            raise ValueError("Eval cache size must be a power of two.")
+        self.size = size
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0] * size
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key: int):
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: int):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "filled": self.size - self.keys.count(None),
+            "size": self.size,
+        }
@@ -1,46 +1,130 @@
+import json
 from board import Board, TYPE_MASK, COLOR_MASK, WHITE, BLACK
+from constants import MAX_PHASE
+from attack_map import find_pinners
+
+# Evaluation parameters: feature -> (middlegame, endgame) weight in centipawns.
+# A position scores the sum of feature count (white minus black) times weight,
+# interpolated between the two by the game phase. Penalties are negative.
+DEFAULT_PARAMETERS = {
+    # Material
+    "pawn": (100, 100),
+    "knight": (320, 320),
+    "bishop": (330, 330),
+    "rook": (500, 500),
+    "queen": (900, 900),
+    "rook_open_file": (25, 25),
+    # Pawn structure
+    "doubled_pawn": (-50, -100),
+    "isolated_pawn": (-50, -100),
+    "passed_pawn": (50, 150),
+    "center_pawn": (50, 50),
+    "center_pawn_neighbour": (25, 25),
+    # King position
+    "king_back_rank": (50, 0),
+    "king_central_file": (-50, 0),
+    "king_zone_attack": (-50, 0),
+    "king_xray": (-50, -50),
+    # Pieces combination
+    "bishop_pair": (10, 100),
+}
+
+# Features of every evaluation term, in DEFAULT_PARAMETERS order
+TERMS = {
+    "material": ["pawn", "knight", "bishop", "rook", "queen", "rook_open_file"],
+    "pawn_structure": ["doubled_pawn", "isolated_pawn", "passed_pawn", "center_pawn", "center_pawn_neighbour"],
+    "king_position": ["king_back_rank", "king_central_file", "king_zone_attack", "king_xray"],
+    "pieces_combination": ["bishop_pair"],
+}
+FEATURES = [name for names in TERMS.values() for name in names]
+PIECE_FEATURES = {1: "pawn", 2: "knight", 3: "bishop", 4: "rook", 5: "queen"}
+
+
+def load_parameters(path: str) -> dict:
+    """Read a JSON parameter file ({"pawn": [mg, eg], ...}); missing features keep their defaults."""
+    with open(path) as f:
+        loaded = json.load(f)
+    parameters = dict(DEFAULT_PARAMETERS)
+    for name, (mg, eg) in loaded.items():
+        if name not in parameters:
+            raise ValueError(f"Unknown evaluation parameter: {name}")
+        parameters[name] = (int(mg), int(eg))
+    return parameters
+
+
+def save_parameters(path: str, parameters: dict):
+    """Write a parameter file load_parameters can read, one feature per line."""
+    lines = [f'    "{name}": [{parameters[name][0]}, {parameters[name][1]}]' for name in FEATURES]
+    with open(path, "w") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
 
 
 class Evaluator:
-    def __init__(self):
-        # Piece values in centipawns
-        self.VALUES = {1: 100, 2: 320, 3: 330, 4: 500, 5: 900, 6: 0}
-
-    def evaluate(self, board: Board) -> int:
-        # Basic evaluation
-        NUMBER_OF_PIECES = len([piece for piece in board.board_pieces if piece != 0])
-
-        material_score = int(self.material_evaluation(board))
-        pawn_structure_score = int(self.pawn_structure_evaluation(board, NUMBER_OF_PIECES))
-        king_position_score = int(self.king_position_evaluation(board, NUMBER_OF_PIECES))
-        pieces_combination_score = int(self.pieces_combination_evaluation(board))
-
-        total_score = material_score + pawn_structure_score + king_position_score + pieces_combination_score
-
-        print(f"Material Score: \t{material_score}")
-        print(f"Pawn Structure Score: \t{pawn_structure_score}")
-        print(f"King Position Score: \t{king_position_score}")
-        print(f"Pieces Comb. Score: \t{pieces_combination_score}")
-        print(f"Total Evaluation: \t{total_score}")
+    def __init__(self, tablebase = None, parameters_path: str = None):
+        self.tablebase = tablebase
+        self.parameters = load_parameters(parameters_path) if parameters_path else dict(DEFAULT_PARAMETERS)
+
+        # Middlegame piece values by piece type (move ordering, zugzwang guard)
+        self.piece_values = [0] * 8
+        for piece_type, name in PIECE_FEATURES.items():
+            self.piece_values[piece_type] = self.parameters[name][0]
+
+    def evaluate(self, board: Board, verbose: bool = False) -> int:
+        # Exact result in tablebase endings
+        if self.tablebase is not None:
+            tablebase_score = self.tablebase.score(board)
+            if tablebase_score is not None:
+                if verbose:
+                    print(f"Tablebase Score: \t{tablebase_score}")
+                return tablebase_score
+
+        scores = self.evaluate_terms(board)
+        total_score = sum(scores.values())
+
+        if verbose:
+            print(f"Material Score: \t{scores['material']}")
+            print(f"Pawn Structure Score: \t{scores['pawn_structure']}")
+            print(f"King Position Score: \t{scores['king_position']}")
+            print(f"Pieces Comb. Score: \t{scores['pieces_combination']}")
+            print(f"Game Phase: \t\t{min(board.phase, MAX_PHASE)}/{MAX_PHASE}")
+            print(f"Total Evaluation: \t{total_score}")
         return total_score
 
-    def material_evaluation(self, board: Board) -> int:
-        score = 0
-        piece_values = {
-            1: 100,  # Pawn
-            2: 320,  # Knight
-            3: 330,  # Bishop
-            4: 500,  # Rook
-            5: 900,  # Queen
-            6: 0     # King
-        }
-
+    def evaluate_terms(self, board: Board) -> dict:
+        """Tapered score of every term: (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE."""
+        features = self.features(board)
+        phase = min(board.phase, MAX_PHASE)
+        parameters = self.parameters
+
+        scores = {}
+        for term, names in TERMS.items():
+            mg = eg = 0
+            for name in names:
+                count = features[name]
+                if count:
+                    mg += count * parameters[name][0]
+                    eg += count * parameters[name][1]
+            scores[term] = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+        return scores
+
+    def features(self, board: Board) -> dict:
+        """Count of every feature, white minus black."""
+        features = dict.fromkeys(FEATURES, 0)
+        self.material_features(board, features)
+        self.pawn_structure_features(board, features)
+        self.king_position_features(board, features)
+        self.pieces_combination_features(board, features)
+        return features
+
+    def material_features(self, board: Board, features: dict):
         for piece in board.board_pieces:
             if piece == 0:
                 continue
             piece_type = piece & TYPE_MASK
-            piece_color = piece & COLOR_MASK
-            value = piece_values[piece_type]
+            if piece_type == 6:
+                continue
+            sign = 1 if (piece & COLOR_MASK) == WHITE else -1
+            features[PIECE_FEATURES[piece_type]] += sign
 
             if piece == 4 or piece == 12:  # Rook on open file
                 file = board.board_pieces.index(piece) % 8
@@ -51,22 +135,10 @@ class Evaluator:
                     if square_piece != 0 and (square_piece & TYPE_MASK) == 1:  # Pawn found
                         pawns_in_file += 1
                         break
-                
-                value += (25 * (2 - pawns_in_file))  # Bonus for open/semi-open file (or penalty if blocked)
-
-            if piece_color == WHITE:
-                score += value
-            else:
-                score -= value
 
-        return score
+                features["rook_open_file"] += sign * (2 - pawns_in_file)  # Open file counts double
 
-    def pawn_structure_evaluation(self, board: Board, number_of_pieces: int) -> int:
-        score = 0
-        doubled_pawn_penalty = 50
-        isolated_pawn_penalty = 50
-        passed_pawn_bonus = 50
-        pawn_controlling_center_bonus = 50
+    def pawn_structure_features(self, board: Board, features: dict):
         pawn_positions = {WHITE: [], BLACK: []}
 
         for index, piece in enumerate(board.board_pieces):
@@ -77,38 +149,29 @@ class Evaluator:
             if piece_type == 1:  # Pawn
                 pawn_positions[piece_color].append(index)
 
-        # Doubled pawns
         for color in [WHITE, BLACK]:
+            sign = 1 if color == WHITE else -1
+
+            # Doubled pawns
             file_counts = [0] * 8
             for pos in pawn_positions[color]:
-                file = pos % 8
-                file_counts[file] += 1
-
+                file_counts[pos % 8] += 1
             for count in file_counts:
                 if count > 1:
-                    if color == WHITE:
-                        score -= (count - 1) * doubled_pawn_penalty
-                    else:
-                        score += (count - 1) * doubled_pawn_penalty
+                    features["doubled_pawn"] += sign * (count - 1)
 
-        # Isolated pawns
-        for color in [WHITE, BLACK]:
+            # Isolated pawns
             files_with_pawns = set()
             for pos in pawn_positions[color]:
                 file = pos % 8
                 if file in [0, 7]:
                     continue
                 files_with_pawns.add(file)
-
             for file in files_with_pawns:
                 if (file - 1 not in files_with_pawns) and (file + 1 not in files_with_pawns):
-                    if color == WHITE:
-                        score -= isolated_pawn_penalty
-                    else:
-                        score += isolated_pawn_penalty
+                    features["isolated_pawn"] += sign
 
-        # Passed pawns
-        for color in [WHITE, BLACK]:
+            # Passed pawns
             for pos in pawn_positions[color]:
                 file = pos % 8
                 rank = pos // 8
@@ -123,20 +186,13 @@ class Evaluator:
                             break
 
                 if is_passed:
-                    if color == WHITE:
-                        score += passed_pawn_bonus
-                    else:
-                        score -= passed_pawn_bonus
+                    features["passed_pawn"] += sign
 
-        # Pawns controlling center
-        center_squares = [27, 28, 35, 36]  # e4, d4, e5, d5
-        for color in [WHITE, BLACK]:
+            # Pawns controlling center
+            center_squares = [27, 28, 35, 36]  # e4, d4, e5, d5
             for pos in pawn_positions[color]:
                 if pos in center_squares:
-                    if color == WHITE:
-                        score += pawn_controlling_center_bonus
-                    else:
-                        score -= pawn_controlling_center_bonus
+                    features["center_pawn"] += sign
 
             for pos in center_squares:
                 file = pos % 8
@@ -146,18 +202,10 @@ class Evaluator:
                     if 0 <= adj_file <= 7:
                         adj_pos = rank * 8 + adj_file
                         if adj_pos in pawn_positions[color]:
-                            if color == WHITE:
-                                score += pawn_controlling_center_bonus // 2
-                            else:
-                                score -= pawn_controlling_center_bonus // 2
-
-        return score * int(round(32 / number_of_pieces))
-    
-    def king_position_evaluation(self, board: Board, number_of_pieces: int) -> int:
-        king_safety_score = 0
-        king_backrank_bonus = self.rescale(number_of_pieces, 2, 32, 0, 50)
-        king_safety_penalty = self.rescale(number_of_pieces, 2, 32, 0, 50)
-        king_xray_penalty = 50
+                            features["center_pawn_neighbour"] += sign
+
+    def king_position_features(self, board: Board, features: dict):
+        attack_map = board.attack_map()
 
         king_positions = {WHITE: - 1, BLACK: - 1}
         for index, piece in enumerate(board.board_pieces):
@@ -172,27 +220,19 @@ class Evaluator:
             king_index = king_positions[color]
             if king_index == -1:
                 continue
+            sign = 1 if color == WHITE else -1
 
             rank = king_index // 8
             file = king_index % 8
 
             # Simple heuristic: kings on back rank and flank files are safer
             if (color == WHITE and rank == 7) or (color == BLACK and rank == 0):
-                if color == WHITE:
-                    king_safety_score += king_backrank_bonus
-                else:
-                    king_safety_score -= king_backrank_bonus
+                features["king_back_rank"] += sign
             else:
-                if color == WHITE:
-                    king_safety_score -= king_backrank_bonus
-                else:
-                    king_safety_score += king_backrank_bonus
-            
+                features["king_back_rank"] -= sign
+
             if file in [3, 4, 5]:  # Central files
-                if color == WHITE:
-                    king_safety_score -= king_safety_penalty
-                else:
-                    king_safety_score += king_safety_penalty
+                features["king_central_file"] += sign
 
             # King safety
             directions = [-9, -8, -7, -1, 1, 7, 8, 9]
@@ -200,80 +240,25 @@ class Evaluator:
                 target_index = king_index + direction
                 if 0 <= target_index < 64:
                     target_piece = board.board_pieces[target_index]
-                    if (target_piece != 0 and (target_piece & COLOR_MASK) != color) or board.is_square_attacked(target_index, color):
-                        if color == WHITE:
-                            king_safety_score -= king_safety_penalty
-                        else:
-                            king_safety_score += king_safety_penalty
-
-            # X-rays and pins to the king
-            enemy_color = BLACK if color == WHITE else WHITE
-            directions = [-9, -8, -7, -1, 1, 7, 8, 9]
-            for direction in directions:
-                current_index = king_index
-                found_own_piece = False
-                while True:
-                    current_index += direction
-                    if not (0 <= current_index < 64):
-                        break
-                    if abs((current_index % 8) - ((current_index - direction) % 8)) > 1:
-                        break  # Edge wrap check
-
-                    piece = board.board_pieces[current_index]
-                    if piece != 0:
-                        if (piece & COLOR_MASK) == color:
-                            if found_own_piece:
-                                break  # Second own piece blocks the line
-                            found_own_piece = True
-                        else:
-                            t = piece & TYPE_MASK
-                            if found_own_piece:
-                                # Check for pinning pieces
-                                if direction in [-9, -7, 7, 9] and t == 3:  # Bishop
-                                    if color == WHITE:
-                                        king_safety_score -= king_xray_penalty
-                                    else:
-                                        king_safety_score += king_xray_penalty
-                                elif direction in [-8, -1, 1, 8] and t == 4:  # Rook
-                                    if color == WHITE:
-                                        king_safety_score -= king_xray_penalty
-                                    else:
-                                        king_safety_score += king_xray_penalty
-                                elif t == 5:  # Queen
-                                    if color == WHITE:
-                                        king_safety_score -= king_xray_penalty
-                                    else:
-                                        king_safety_score += king_xray_penalty
-                            break  # Enemy piece encountered, stop searching
-
-        return king_safety_score
-
-    def pieces_combination_evaluation(self, board: Board) -> int:
-        score = 0
-        number_of_pawns = len([p for p in board.board_pieces if p != 0 and (p & TYPE_MASK) == 1])
-        max_bishop_pair_bonus = 100
-        bishop_pair_bonus = self.rescale(number_of_pawns, 0, 16, max_bishop_pair_bonus, 10)
+                    if (target_piece != 0 and (target_piece & COLOR_MASK) != color) or attack_map.is_attacked(target_index, color):
+                        features["king_zone_attack"] += sign
+
+            # X-rays and pins to the king: enemy sliders behind exactly one own piece
+            features["king_xray"] += sign * len(find_pinners(board.board_pieces, king_index, color, board.occupied))
 
+    def pieces_combination_features(self, board: Board, features: dict):
         white_bishops = [i for i, p in enumerate(board.board_pieces) if p != 0 and (p & TYPE_MASK) == 3 and (p & COLOR_MASK) == WHITE]
         black_bishops = [i for i, p in enumerate(board.board_pieces) if p != 0 and (p & TYPE_MASK) == 3 and (p & COLOR_MASK) == BLACK]
 
         # Bishop pair bonus
         if len(white_bishops) >= 2:
-            score += bishop_pair_bonus
+            features["bishop_pair"] += 1
         if len(black_bishops) >= 2:
-            score -= bishop_pair_bonus
+            features["bishop_pair"] -= 1
 
-        return score
-    
-    def rescale(self, x, n, m, alfa, beta):
-        """Rescale x from range [n, m] to range [alfa, beta]."""
-        return ((x - n) * (beta - alfa)) / (m - n) + alfa
-    
 
 if __name__ == "__main__":
-    eval = Evaluator()
-    print(eval.rescale(16, 0, 16, 100, 10))
-    print(eval.rescale(8, 0, 16, 100, 10))
-    print(eval.rescale(2, 0, 16, 100, 10))
-    print(eval.rescale(1, 0, 16, 100, 10))
-    print(eval.rescale(0, 0, 16, 100, 10))
\ No newline at end of file
+    evaluator = Evaluator()
+    board = Board("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    print(evaluator.features(board))
+    evaluator.evaluate(board, verbose = True)
@@ -3,12 +3,13 @@ import sys
 import os
 import time
 from move import Move
-from board import Board
+from board import Board, PIECE_TABLE
 from engine import Engine
+from pgn import move_to_san, write_game
 
 
 class Interface:
-    def __init__(self, board: Board, engine: Engine):
+    def __init__(self, board: Board, engine: Engine, pgn_path: str = None):
         # --- Constants ---
         self.WINDOW_SIZE = 900
         self.SQUARE_SIZE = 800
@@ -24,6 +25,11 @@ class Interface:
         self.engine = engine
         self.update_position()
 
+        # --- Game record ---
+        self.pgn_path = pgn_path
+        self.start_fen = board.fen
+        self.san_moves = []
+
         # --- Drag and Drop State ---
         self.selected_piece = None # Piece being dragged
         self.selected_sq_idx = None # Original square
@@ -50,8 +56,9 @@ class Interface:
         self._create_board_surface()
 
     def update_position(self):
-        """Synchronize local position with the Board object FEN."""
+        """Synchronize local position with the Board object FEN, and see if the game is over."""
         self.position = self.board.fen.split()[0]
+        self.outcome = self.engine.outcome()
 
     # ------------------ Assets ------------------
 
@@ -203,21 +210,42 @@ class Interface:
                         if panel_x <= mx <= panel_x + panel_w:
                             idx = (mx - panel_x) // self.BOARD_SIZE
                             chosen_char = chars[min(idx, 3)]
-                            # Return the integer ID from your piece_map (e.g., 5 + WHITE)
-                            return self.board.piece_map[chosen_char]
+                            # Return the integer ID from the piece table (e.g., 5 + WHITE)
+                            return PIECE_TABLE[chosen_char]
 
     def move(self, from_sq, to_sq, promotion = None):
         """Attempts to move a piece from from_sq to to_sq."""
         print(f"Attempting move from {from_sq} to {to_sq}")
         move = Move(from_sq, to_sq, promotion)
-        legal_moves = self.engine.search(0)
+        legal_moves = self.engine.find_legal_moves()
         if move in legal_moves:
             print("Move is legal, executing.")
+            self.san_moves.append(move_to_san(self.engine, move, legal_moves))
             self.board.move_piece(move)
             self.update_position()
         else:
             print("Illegal move attempted.")
 
+    def save_game(self):
+        """Append the game played so far to the PGN file."""
+        if not self.pgn_path or not self.san_moves:
+            return
+
+        result = self.outcome[0] if self.outcome is not None else "*"
+
+        player, computer = "Player", "Engine"
+        headers = {
+            "Event": "Casual game",
+            "Site": "local",
+            "Date": time.strftime("%Y.%m.%d"),
+            "Round": "-",
+            "White": player if self.player_side == 'w' else computer,
+            "Black": computer if self.player_side == 'w' else player,
+        }
+        with open(self.pgn_path, "a") as f:
+            write_game(f, self.san_moves, result, headers, self.start_fen)
+        print(f"Game saved to {self.pgn_path}")
+
     # ------------------ Rendering ------------------
 
     def draw_pieces(self):
@@ -247,32 +275,44 @@ class Interface:
         print("-------------------------------------------------------------")
         self.engine.evaluate()
 
+        game_over_reported = False
         while self.running:
-            if self.board.active_color == player_side:
-                # print("White to move")
-                self.handle_events()
-            if self.board.active_color == computer_side:
-                # print("Black to move")
-                start_time = time.time()
-                print("-------------------------------------------------------------")
-                self.engine.evaluate()
-                engine_move = self.engine.engine_move()
-                if engine_move:
-                    self.board.move_piece(engine_move)
-                    self.update_position()
-                    end_time = time.time()
-                    print(f"Engine move took {end_time - start_time:.5f} seconds")
-                else:
-                    print("Engine has no legal moves.")
-                    self.running = False
+            if self.outcome is not None:
+                # Game over: keep showing the final position until the window is closed
+                if not game_over_reported:
+                    print(f"Game over: {self.outcome[0]} by {self.outcome[1]}.")
+                    game_over_reported = True
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.running = False
+            else:
+                if self.board.active_color == player_side:
+                    # print("White to move")
+                    self.handle_events()
+                if self.board.active_color == computer_side:
+                    # print("Black to move")
+                    start_time = time.time()
+                    print("-------------------------------------------------------------")
+                    self.engine.evaluate()
+                    engine_move = self.engine.engine_move()
+                    if engine_move:
+                        self.san_moves.append(move_to_san(self.engine, engine_move))
+                        self.board.move_piece(engine_move)
+                        self.update_position()
+                        end_time = time.time()
+                        print(f"Engine move took {end_time - start_time:.5f} seconds")
+                    else:
+                        print("Engine has no legal moves.")
+                        self.running = False
                 
-                print("-------------------------------------------------------------")
-                self.engine.evaluate()
+                    print("-------------------------------------------------------------")
+                    self.engine.evaluate()
 
             self.screen.blit(self.board_surface, (0, 0))
             self.draw_pieces()
             pygame.display.flip()
             self.clock.tick(self.FPS)
 
+        self.save_game()
         pygame.quit()
         sys.exit()
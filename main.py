@@ -1,11 +1,15 @@
 from interface import Interface
 from board import Board
 from engine import Engine
+import os
 STARTING_POSITION = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 # STARTING_POSITION = "r1bqk2r/ppp2ppp/2n2n2/2bpp1B1/2B1P3/P2P1N2/1PP3PP/RN1QK2R w KQkq - 0 1"
 # STARTING_POSITION = "rn1qk2r/pp2ppbp/2p2np1/3p4/2PPb1PN/4P3/PP2BP1P/RNBQK2R w KQkq - 0 1"
 # STARTING_POSITION = "8/P7/8/8/8/8/8/k6K w - - 0 0" # Promotion test
 DEFAULT_PLAYER_SIDE = 'w'
+BOOK_PATH = "book.bin" # Polyglot opening book, used if present
+TABLEBASE_PATH = "tablebases" # Endgame tables from tablebase.py, used if present
+PGN_PATH = "games.pgn" # Played games are appended here
 
 
 def main():
@@ -29,8 +33,12 @@ def main():
 
 def start_game(FEN, PLAYER_SIDE):
     board = Board(FEN)
-    engine = Engine(board)
-    interface = Interface(board, engine)
+    engine = Engine(
+        board,
+        book_path = BOOK_PATH if os.path.exists(BOOK_PATH) else None,
+        tablebase_path = TABLEBASE_PATH if os.path.isdir(TABLEBASE_PATH) else None,
+    )
+    interface = Interface(board, engine, pgn_path = PGN_PATH)
 
     print(f"Game started as {PLAYER_SIDE} with FEN: {FEN}")    
     interface.run(player_side = PLAYER_SIDE)
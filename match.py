@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import io
+import math
+import multiprocessing
+import random
+import time
+from board import Board
+from engine import Engine
+from pgn import move_to_san, write_game
+
+DEFAULT_OPENINGS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkb1r/pppppppp/5n2/8/2P5/8/PP1PPPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/3PP3/8/PPP2PPP/RNBQKBNR b KQkq - 0 2",
+]
+
+
+def play_game(task: tuple) -> dict:
+    """Play one game between two Engine configurations (runs in a worker process)."""
+    game_index, start_fen, white_config, black_config, max_moves = task
+    board = Board(start_fen)
+    engines = {'w': Engine(board, **white_config), 'b': Engine(board, **black_config)}
+    san_moves = []
+
+    # Engines report every move on stdout, keep workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            engine = engines[board.active_color]
+
+            # Adjudication
+            outcome = engine.outcome()
+            if outcome is not None:
+                result, termination = outcome
+                break
+            if len(san_moves) >= 2 * max_moves:
+                result, termination = "1/2-1/2", "move limit"
+                break
+
+            move = engine.engine_move()
+            san_moves.append(move_to_san(engine, move))
+            board.make_move(move)
+
+    return {
+        "index": game_index,
+        "start_fen": start_fen,
+        "white": white_config,
+        "black": black_config,
+        "san_moves": san_moves,
+        "result": result,
+        "termination": termination,
+    }
+
+
+def expected_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(wins: int, draws: int, losses: int) -> tuple:
+    """Elo difference and 95% error margin from a win/draw/loss count."""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return (math.inf if score >= 1 else -math.inf), math.inf
+
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin_score = 1.96 * math.sqrt(variance / games)
+
+    def to_elo(s):
+        s = min(max(s, 1e-9), 1 - 1e-9)
+        return -400 * math.log10(1 / s - 1)
+
+    return to_elo(score), (to_elo(score + margin_score) - to_elo(score - margin_score)) / 2
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """Log-likelihood ratio of H1 (elo1) against H0 (elo0), trinomial GSPRT approximation."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins + draws / 4) / games - score ** 2
+    if variance <= 0:
+        return 0.0
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return (s1 - s0) * (2 * score - s0 - s1) / (2 * variance / games)
+
+
+def sprt_bounds(alpha: float, beta: float) -> tuple:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def run_match(config_a: dict, config_b: dict, openings: list, games: int, workers: int = None,
+              pgn_path: str = None, max_moves: int = 200, elo0: float = 0, elo1: float = 10,
+              alpha: float = 0.05, beta: float = 0.05, seed: int = None) -> dict:
+    """Play config_a against config_b, each opening with both colors, until games or an SPRT bound.
+
+    Openings are shuffled and never reused: fixed-depth engines replay the
+    same game from the same start, and repeats would count as independent
+    samples. More games than two per opening raise ValueError.
+    """
+    openings = list(dict.fromkeys(openings)) # Duplicate lines would replay games too
+    if games > 2 * len(openings):
+        raise ValueError(f"{games} games need at least {(games + 1) // 2} distinct openings, got {len(openings)}")
+    random.Random(seed).shuffle(openings)
+
+    tasks = []
+    for i in range(games):
+        opening = openings[i // 2]
+        if i % 2 == 0:
+            tasks.append((i, opening, config_a, config_b, max_moves))
+        else:
+            tasks.append((i, opening, config_b, config_a, max_moves))
+
+    lower, upper = sprt_bounds(alpha, beta)
+    wins = draws = losses = 0
+    llr = 0.0
+    verdict = None
+    start_time = time.time()
+
+    pgn_file = open(pgn_path, "a") if pgn_path else None
+    with multiprocessing.Pool(workers) as pool:
+        for game in pool.imap_unordered(play_game, tasks):
+            a_is_white = game["index"] % 2 == 0
+            if game["result"] == "1/2-1/2":
+                draws += 1
+            elif (game["result"] == "1-0") == a_is_white:
+                wins += 1
+            else:
+                losses += 1
+
+            if pgn_file:
+                headers = {
+                    "Event": "Self-play match",
+                    "Site": "local",
+                    "Date": time.strftime("%Y.%m.%d"),
+                    "Round": str(game["index"] + 1),
+                    "White": format_config(game["white"]),
+                    "Black": format_config(game["black"]),
+                    "Termination": game["termination"],
+                }
+                write_game(pgn_file, game["san_moves"], game["result"], headers, game["start_fen"])
+                pgn_file.flush()
+
+            llr = sprt_llr(wins, draws, losses, elo0, elo1)
+            print(f"Game {wins + draws + losses}/{games}: +{wins} ={draws} -{losses}  LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]")
+            if llr >= upper:
+                verdict = "H1"
+                break
+            if llr <= lower:
+                verdict = "H0"
+                break
+        pool.terminate()
+    if pgn_file:
+        pgn_file.close()
+
+    elo, margin = elo_difference(wins, draws, losses)
+    return {
+        "wins": wins, "draws": draws, "losses": losses,
+        "elo": elo, "elo_margin": margin,
+        "llr": llr, "sprt": verdict,
+        "seconds": time.time() - start_time,
+    }
+
+
+def parse_config(text: str) -> dict:
+    """'depth=2,book_path=book.bin' -> Engine keyword arguments."""
+    config = {}
+    for item in filter(None, text.split(",")):
+        key, value = item.split("=", 1)
+        try:
+            config[key] = int(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def format_config(config: dict) -> str:
+    return "Engine(" + ", ".join(f"{key}={value}" for key, value in config.items()) + ")"
+
+
+def load_openings(path: str) -> list:
+    """One FEN (or EPD with the first four fields) per line."""
+    openings = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split(";")[0].split()
+            if len(fields) >= 6 and fields[4].isdigit():
+                openings.append(" ".join(fields[:6]))
+            elif len(fields) >= 4:
+                openings.append(" ".join(fields[:4]) + " 0 1")
+    return openings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Headless engine vs engine match with SPRT.")
+    parser.add_argument("--engine1", default = "depth=2", help = "Engine keyword arguments, e.g. depth=2")
+    parser.add_argument("--engine2", default = "depth=1")
+    parser.add_argument("--games", type = int, default = None, help = "default: two per opening")
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--openings", help = "FEN/EPD file, one position per line")
+    parser.add_argument("--pgn", default = "match.pgn")
+    parser.add_argument("--max-moves", type = int, default = 200)
+    parser.add_argument("--elo0", type = float, default = 0)
+    parser.add_argument("--elo1", type = float, default = 10)
+    parser.add_argument("--alpha", type = float, default = 0.05)
+    parser.add_argument("--beta", type = float, default = 0.05)
+    parser.add_argument("--seed", type = int, default = None, help = "seed for the opening order")
+    args = parser.parse_args()
+
+    openings = load_openings(args.openings) if args.openings else DEFAULT_OPENINGS
+    distinct = len(set(openings))
+    if args.games is None:
+        args.games = 2 * distinct
+    elif args.games > 2 * distinct:
+        parser.error(f"--games {args.games} needs at least {(args.games + 1) // 2} distinct openings, "
+                     f"{'--openings' if args.openings else 'the built-in list'} has {distinct}; pass a larger --openings file")
+    summary = run_match(
+        parse_config(args.engine1), parse_config(args.engine2), openings, args.games,
+        workers = args.workers, pgn_path = args.pgn, max_moves = args.max_moves,
+        elo0 = args.elo0, elo1 = args.elo1, alpha = args.alpha, beta = args.beta, seed = args.seed,
+    )
+    print(f"Score of {args.engine1} vs {args.engine2}: +{summary['wins']} ={summary['draws']} -{summary['losses']}")
+    print(f"Elo difference: {summary['elo']:.1f} +/- {summary['elo_margin']:.1f}")
+    print(f"SPRT ({args.elo0}, {args.elo1}): LLR {summary['llr']:.2f}, {summary['sprt'] or 'inconclusive'}")
+    print(f"Finished in {summary['seconds']:.1f} seconds")
@@ -0,0 +1,186 @@
+INFINITE = 1 << 30 # Proof / disproof number of a solved node
+
+
+class MateTable:
+    """Fixed-size proof table: (position hash, plies left) -> (pn, dn, mate length).
+
+    Slots are picked by the low bits of the key and always replaced, like
+    EvalCache, so a long solve never uses more memory than the chosen size.
+    """
+
+    def __init__(self, size: int = 1 << 18):
+        if size <= 0 or size & (size - 1):
+            raise ValueError("Mate table size must be a power of two.")
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.entries = [None] * size
+
+    def probe(self, key: int):
+        index = key & self.mask
+        if self.keys[index] == key:
+            return self.entries[index]
+        return None
+
+    def store(self, key: int, entry: tuple):
+        index = key & self.mask
+        self.keys[index] = key
+        self.entries[index] = entry
+
+
+class MateSolver:
+    """Depth-first proof-number search (df-pn) for a forced mate by the side to move.
+
+    The attacker moves at OR nodes and needs one move that mates, the
+    defender at AND nodes where every reply must lose. Only the proof and
+    disproof numbers decide which line to look at next, so no evaluation is
+    ever computed. Attacker moves are tried checks first; with checks_only
+    quiet attacker moves are skipped altogether.
+    """
+
+    def __init__(self, engine, table_size: int = 1 << 18, checks_only: bool = False, max_nodes: int = None):
+        self.engine = engine
+        self.board = engine.board
+        self.table = MateTable(table_size)
+        self.checks_only = checks_only
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.attacker = None
+
+    def solve(self, max_plies: int):
+        """Shortest mating line within max_plies plies (odd: mate in n is 2n - 1 plies), or None.
+
+        Bounds 1, 3, 5, ... are tried in turn, so the first proof is the shortest mate.
+        Returns None as well when max_nodes runs out.
+        """
+        self.nodes = 0
+        self.attacker = self.board.active_color
+        for plies in range(1, max_plies + 1, 2):
+            pn, dn, _ = self._mid(plies, INFINITE, INFINITE)
+            if pn == 0:
+                return self._line(plies)
+            if self.max_nodes is not None and self.nodes >= self.max_nodes:
+                return None
+        return None
+
+    # Proof-number search
+
+    def _key(self, plies: int) -> int:
+        return (self.board.hash << 8) | plies
+
+    def _mid(self, plies: int, pn_threshold: int, dn_threshold: int) -> tuple:
+        """Expand the current position until its pn or dn reaches the threshold; returns (pn, dn, mate length)."""
+        self.nodes += 1
+        key = self._key(plies)
+        entry = self.table.probe(key)
+        if entry is not None and (entry[0] >= pn_threshold or entry[1] >= dn_threshold):
+            return entry
+
+        board = self.board
+        or_node = board.active_color == self.attacker
+
+        # Positions that need no expansion
+        if board.is_repetition():
+            return INFINITE, 0, 0 # Draw on this path: not stored, another path may still mate
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return 1, 1, 0 # Out of budget: unknown
+        if or_node and (plies == 0 or board.is_insufficient_material()):
+            return self._store(key, (INFINITE, 0, 0))
+        if not or_node and plies == 0:
+            mated = self.engine.is_check() and not self.engine.has_any_legal_move()
+            return self._store(key, (0, INFINITE, 0) if mated else (INFINITE, 0, 0))
+
+        children = self._children(or_node, plies)
+        if not children:
+            if or_node or not self.engine.is_check():
+                return self._store(key, (INFINITE, 0, 0)) # Attacker stuck, or stalemate
+            return self._store(key, (0, INFINITE, 0)) # Checkmate
+
+        while True:
+            if or_node:
+                pn = min(child[1] for child in children)
+                dn = min(INFINITE, sum(child[2] for child in children))
+            else:
+                pn = min(INFINITE, sum(child[1] for child in children))
+                dn = min(child[2] for child in children)
+            if pn >= pn_threshold or dn >= dn_threshold or self._out_of_nodes():
+                break
+
+            # Most proving child (smallest pn at OR nodes, smallest dn at AND nodes) and the runner-up
+            index = 1 if or_node else 2
+            order = sorted(range(len(children)), key = lambda i: children[i][index])
+            best = children[order[0]]
+            second = children[order[1]][index] if len(order) > 1 else INFINITE
+            if or_node:
+                child_pn_threshold = min(pn_threshold, second + 1)
+                child_dn_threshold = min(INFINITE, dn_threshold - dn + best[2])
+            else:
+                child_pn_threshold = min(INFINITE, pn_threshold - pn + best[1])
+                child_dn_threshold = min(dn_threshold, second + 1)
+
+            board.make_move(best[0])
+            best[1:] = self._mid(plies - 1, child_pn_threshold, child_dn_threshold)
+            board.unmake_move()
+
+        # Mate length: the attacker takes the quickest mate, the defender the slowest
+        length = 0
+        if pn == 0:
+            proven = [child[3] for child in children if child[1] == 0]
+            length = 1 + (min(proven) if or_node else max(proven))
+        return self._store(key, (pn, dn, length))
+
+    def _store(self, key: int, entry: tuple) -> tuple:
+        self.table.store(key, entry)
+        return entry
+
+    def _out_of_nodes(self) -> bool:
+        return self.max_nodes is not None and self.nodes >= self.max_nodes
+
+    def _children(self, or_node: bool, plies: int) -> list:
+        """[move, pn, dn, mate length] of every move to search, from the table when known (1, 1 if new).
+
+        Attacker moves come checks first, and only checks are kept on the
+        last ply (a mating move always gives check) or with checks_only.
+        """
+        board = self.board
+        checks, quiet = [], []
+        for move in self.engine.find_legal_moves():
+            board.make_move(move)
+            child = [move, *(self.table.probe(self._key(plies - 1)) or (1, 1, 0))]
+            if or_node and not board.is_check():
+                quiet.append(child)
+            else:
+                checks.append(child)
+            board.unmake_move()
+        if or_node and (self.checks_only or plies == 1):
+            return checks
+        return checks + quiet
+
+    # Mating line
+
+    def _line(self, plies: int) -> list:
+        """Follow a proven position down to the mate: quickest mate for the attacker, longest defence for the defender."""
+        board = self.board
+        line = []
+        while True:
+            or_node = board.active_color == self.attacker
+            moves = [child[0] for child in self._children(or_node, plies)] if plies > 0 else []
+            best_move, best_length = None, None
+            for move in moves:
+                board.make_move(move)
+                entry = self.table.probe(self._key(plies - 1))
+                if entry is None: # Evicted: prove this reply again
+                    entry = self._mid(plies - 1, INFINITE, INFINITE)
+                board.unmake_move()
+                if entry[0] != 0:
+                    continue
+                if best_move is None or (entry[2] < best_length if or_node else entry[2] > best_length):
+                    best_move, best_length = move, entry[2]
+            if best_move is None:
+                break # Checkmate on the board
+            line.append(best_move)
+            board.make_move(best_move)
+            plies -= 1
+
+        for _ in line:
+            board.unmake_move()
+        return line
@@ -0,0 +1,238 @@
+import re
+from board import Board, square_name, square_index
+from engine import Engine
+from constants import TYPE_MASK
+
+STARTING_POSITION = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PIECE_LETTERS = {2: 'N', 3: 'B', 4: 'R', 5: 'Q', 6: 'K'}
+PIECE_TYPES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+RESULTS = ["1-0", "0-1", "1/2-1/2", "*"]
+HEADER_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'[{}();]|\$\d+|[^\s{}();]+')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.*$')
+SEVEN_TAG_ROSTER = ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+
+
+def move_to_san(engine, move, legal_moves: list = None) -> str:
+    """Standard algebraic notation of a legal move in the engine's current position."""
+    board = engine.board
+    if legal_moves is None:
+        legal_moves = engine.find_legal_moves()
+
+    src, dest, *promotion = move
+    piece = board.board_pieces[src]
+    piece_type = piece & TYPE_MASK
+
+    if piece_type == 6 and abs(dest - src) == 2:
+        san = "O-O" if dest > src else "O-O-O"
+    elif piece_type == 1:
+        san = ""
+        if src % 8 != dest % 8: # Capture (en passant included)
+            san = square_name(src)[0] + "x"
+        san += square_name(dest)
+        if promotion:
+            san += "=" + PIECE_LETTERS[promotion[0] & TYPE_MASK]
+    else:
+        san = PIECE_LETTERS[piece_type]
+
+        # Disambiguation between identical pieces reaching the same square
+        others = [m[0] for m in legal_moves if m[1] == dest and m[0] != src and board.board_pieces[m[0]] == piece]
+        if others:
+            if all(other % 8 != src % 8 for other in others):
+                san += square_name(src)[0]
+            elif all(other // 8 != src // 8 for other in others):
+                san += square_name(src)[1]
+            else:
+                san += square_name(src)
+
+        if board.board_pieces[dest] != 0:
+            san += "x"
+        san += square_name(dest)
+
+    # Check and mate suffix
+    board.make_move(move)
+    if engine.is_check():
+        san += "+" if engine.find_legal_moves() else "#"
+    board.unmake_move()
+
+    return san
+
+
+def write_game(stream, san_moves: list, result: str, headers: dict = None, start_fen: str = STARTING_POSITION):
+    """Write one game in PGN export format."""
+    headers = dict(headers or {})
+    headers["Result"] = result
+    if start_fen != STARTING_POSITION:
+        headers["SetUp"] = "1"
+        headers["FEN"] = start_fen
+
+    for tag in SEVEN_TAG_ROSTER:
+        stream.write(f'[{tag} "{headers.get(tag, "?")}"]\n')
+    for tag, value in headers.items():
+        if tag not in SEVEN_TAG_ROSTER:
+            stream.write(f'[{tag} "{value}"]\n')
+    stream.write("\n")
+
+    fen_parts = start_fen.split()
+    move_number = max(int(fen_parts[5]), 1)
+    white_to_move = fen_parts[1] == 'w'
+
+    tokens = []
+    for i, san in enumerate(san_moves):
+        if white_to_move:
+            tokens.append(f"{move_number}. {san}")
+        elif i == 0:
+            tokens.append(f"{move_number}... {san}")
+        else:
+            tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+
+    # Wrap movetext at 80 columns
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            stream.write(line + "\n")
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    stream.write(line + "\n\n")
+
+
+def parse_san(engine, san: str, legal_moves: list = None):
+    """Find the legal move written as san in the engine's current position."""
+    board = engine.board
+    if legal_moves is None:
+        legal_moves = engine.find_legal_moves()
+
+    text = san.rstrip("+#!?")
+    if not text:
+        raise ValueError(f"Invalid SAN: {san}")
+
+    # Castling
+    if text in ["O-O", "0-0", "O-O-O", "0-0-0"]:
+        kingside = text in ["O-O", "0-0"]
+        for move in legal_moves:
+            if (board.board_pieces[move[0]] & TYPE_MASK) == 6 and move[1] - move[0] == (2 if kingside else -2):
+                return move
+        raise ValueError(f"Illegal castling: {san}")
+
+    # Promotion (e8=Q or e8Q)
+    promotion = None
+    if "=" in text:
+        text, letter = text.split("=", 1)
+        if len(letter) != 1 or letter.upper() not in "QRBN":
+            raise ValueError(f"Illegal move: {san}")
+        promotion = PIECE_TYPES[letter.upper()]
+    elif len(text) > 2 and text[-1] in "QRBN" and text[-2].isdigit():
+        text, promotion = text[:-1], PIECE_TYPES[text[-1]]
+
+    piece_type = 1
+    if text and text[0] in PIECE_TYPES:
+        piece_type, text = PIECE_TYPES[text[0]], text[1:]
+    text = text.replace("x", "").replace(":", "").replace("-", "")
+
+    if len(text) < 2 or text[-2] not in "abcdefgh" or text[-1] not in "12345678":
+        raise ValueError(f"Invalid SAN: {san}")
+    dest = square_index(text[-2:])
+    hint = text[:-2]
+
+    candidates = []
+    for move in legal_moves:
+        src = move[0]
+        if move[1] != dest or (board.board_pieces[src] & TYPE_MASK) != piece_type:
+            continue
+        if any(square_name(src)[c.isdigit()] != c for c in hint):
+            continue
+        move_promotion = move[2] & TYPE_MASK if len(move) > 2 else None
+        if move_promotion != promotion:
+            continue
+        candidates.append(move)
+
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move: {san}")
+    return candidates[0]
+
+
+class Game:
+    """One game from a PGN file: tag pairs, SAN moves and the result."""
+
+    def __init__(self, headers: dict, moves: list, result: str):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def start_fen(self) -> str:
+        return self.headers.get("FEN", STARTING_POSITION)
+
+    def positions(self):
+        """Replay the game, yielding (board, move) before every move.
+
+        The same Board is updated in place; copy what you need to keep.
+        """
+        board = Board(self.start_fen())
+        engine = Engine(board, depth = 0, eval_cache_size = 1)
+        for san in self.moves:
+            move = parse_san(engine, san)
+            yield board, move
+            board.make_move(move)
+
+    def write(self, stream):
+        write_game(stream, self.moves, self.result, self.headers, self.start_fen())
+
+
+def read_games(stream):
+    """Lazily yield every Game of a PGN stream, one line at a time (constant memory)."""
+    headers, moves = {}, []
+    in_comment = False
+    variation_depth = 0
+
+    for line in stream:
+        # Escape lines and tag pairs only count outside comments/variations
+        if not in_comment and variation_depth == 0:
+            if line.startswith("%"):
+                continue
+            stripped = line.strip()
+            if stripped.startswith("["):
+                if moves:
+                    # Game without a result token, start of the next one
+                    yield Game(headers, moves, "*")
+                    headers, moves = {}, []
+                match = HEADER_PATTERN.match(stripped)
+                if match:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"')
+                continue
+
+        for token in TOKEN_PATTERN.findall(line):
+            if in_comment:
+                if token == "}":
+                    in_comment = False
+                continue
+            if token == "{":
+                in_comment = True
+            elif token == ";":
+                break # Rest of line is a comment
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth > 0 or token.startswith("$") or MOVE_NUMBER_PATTERN.match(token):
+                continue
+            elif token in RESULTS:
+                yield Game(headers, moves, token)
+                headers, moves = {}, []
+            else:
+                # "12.e4" style tokens carry the move number in front
+                moves.append(token.split(".")[-1])
+
+    if moves or headers:
+        yield Game(headers, moves, headers.get("Result", "*"))
+
+
+def read_positions(stream):
+    """Yield (game, board, move) for every position of every game in a PGN stream."""
+    for game in read_games(stream):
+        for board, move in game.positions():
+            yield game, board, move
@@ -0,0 +1,109 @@
+import mmap
+import os
+import random
+import struct
+from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK
+from move import Move
+
+ENTRY = struct.Struct(">QHHI") # key, move, weight, learn
+KEY = struct.Struct(">Q")
+
+# Polyglot encodes castling as "king captures own rook"
+CASTLING_MOVES = {(60, 63): 62, (60, 56): 58, (4, 7): 6, (4, 0): 2}
+
+
+class OpeningBook:
+    """Polyglot (.bin) opening book, memory-mapped and searched in place."""
+
+    def __init__(self, path: str, selection: str = "weighted"):
+        if selection not in ["weighted", "best"]:
+            raise ValueError("Book selection must be 'weighted' or 'best'.")
+        self.selection = selection
+        self.path = path
+        self.file = open(path, "rb")
+        if os.path.getsize(path) == 0:
+            self.data = b""
+        else:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        self.size = len(self.data) // ENTRY.size
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def find_entries(self, key: int) -> list:
+        """Return (move, weight) for every book entry with this key."""
+        # Binary search for the first entry with entry key >= key
+        low, high = 0, self.size
+        while low < high:
+            mid = (low + high) // 2
+            if KEY.unpack_from(self.data, mid * ENTRY.size)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+
+        entries = []
+        index = low
+        while index < self.size:
+            entry_key, raw_move, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((raw_move, weight))
+            index += 1
+        return entries
+
+    def get_moves(self, board, legal_moves: list = None) -> list:
+        """Return (Move, weight) for every book move in this position.
+
+        Corrupt books and key collisions can hold illegal moves: with
+        legal_moves only those are kept, else only moves of our own pieces.
+        """
+        moves = []
+        active = WHITE if board.active_color == 'w' else BLACK
+        for raw_move, weight in self.find_entries(board.hash):
+            move = self.decode_move(board, raw_move)
+            if legal_moves is not None:
+                if move not in legal_moves:
+                    continue
+            else:
+                piece = board.board_pieces[move[0]]
+                if piece == 0 or (piece & COLOR_MASK) != active:
+                    continue
+            moves.append((move, weight))
+        return moves
+
+    def choose_move(self, board, legal_moves: list = None):
+        moves = [(move, weight) for move, weight in self.get_moves(board, legal_moves) if weight > 0]
+        if not moves:
+            return None
+
+        if self.selection == "best":
+            return max(moves, key = lambda entry: entry[1])[0]
+        return random.choices([move for move, _ in moves], weights = [weight for _, weight in moves])[0]
+
+    def decode_move(self, board, raw_move: int) -> Move:
+        to_file = raw_move & 7
+        to_row = (raw_move >> 3) & 7
+        from_file = (raw_move >> 6) & 7
+        from_row = (raw_move >> 9) & 7
+        promotion = (raw_move >> 12) & 7
+
+        # Polyglot rows count from rank 1, Board rows from rank 8
+        src = (7 - from_row) * 8 + from_file
+        dest = (7 - to_row) * 8 + to_file
+
+        piece = board.board_pieces[src]
+        if (piece & TYPE_MASK) == 6 and (src, dest) in CASTLING_MOVES:
+            dest = CASTLING_MOVES[(src, dest)]
+
+        if promotion:
+            # Polyglot: 1 knight, 2 bishop, 3 rook, 4 queen
+            return Move(src, dest, promotion = promotion + 1 + (piece & COLOR_MASK))
+        return Move(src, dest)
@@ -0,0 +1,154 @@
+import argparse
+import cProfile
+import json
+import pstats
+import time
+from board import Board
+from engine import Engine
+from evaluator import Evaluator
+from attack_map import AttackMap
+
+# (class, method, stage label) instrumented by Profiler
+STAGES = [
+    (Engine, "find_legal_moves", "movegen"),
+    (Engine, "filter_legal_moves", "legality"),
+    (Board, "is_square_attacked", "is_square_attacked"),
+    (AttackMap, "__init__", "attack map"),
+    (Board, "make_move", "make_move"),
+    (Board, "unmake_move", "unmake_move"),
+    (Engine, "evaluate_position", "eval (cached)"),
+    (Evaluator, "evaluate", "eval"),
+    (Evaluator, "material_features", "eval: material"),
+    (Evaluator, "pawn_structure_features", "eval: pawn structure"),
+    (Evaluator, "king_position_features", "eval: king position"),
+    (Evaluator, "pieces_combination_features", "eval: pieces combination"),
+]
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.time = 0.0
+        self.depth = 0 # Recursion depth, only the outermost call is timed
+
+
+class Profiler:
+    """Opt-in call counts and cumulative time per search stage.
+
+    Inside the with block the instrumented methods are swapped for timing
+    wrappers; outside it the original methods are back, so a disabled
+    profiler costs nothing. With trace = True every call is also recorded
+    as an open/close event for a speedscope dump.
+    """
+
+    def __init__(self, stages: list = None, trace: bool = False):
+        self.stages = stages if stages is not None else STAGES
+        self.trace = trace
+        self.stats = {}
+        self.frames = []
+        self.events = []
+        self.originals = []
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+    def __enter__(self):
+        for cls, method, name in self.stages:
+            original = cls.__dict__[method]
+            stat = self.stats.setdefault(name, StageStats(name))
+            self.originals.append((cls, method, original))
+            setattr(cls, method, self._instrument(original, stat, len(self.frames)))
+            self.frames.append({"name": name})
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.end_time = time.perf_counter()
+        for cls, method, original in reversed(self.originals):
+            setattr(cls, method, original)
+        self.originals = []
+
+    def _instrument(self, function, stat: StageStats, frame: int):
+        perf_counter = time.perf_counter
+        events = self.events
+        trace = self.trace
+
+        def wrapper(*args, **kwargs):
+            stat.calls += 1
+            stat.depth += 1
+            start = perf_counter()
+            if trace:
+                events.append({"type": "O", "frame": frame, "at": start})
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                if trace:
+                    events.append({"type": "C", "frame": frame, "at": end})
+                stat.depth -= 1
+                if stat.depth == 0:
+                    stat.time += end - start
+
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def report(self) -> str:
+        total = self.end_time - self.start_time
+        lines = [f"{'stage':<28}{'calls':>10}{'total s':>10}{'per call us':>14}{'% time':>9}"]
+        for stat in sorted(self.stats.values(), key = lambda s: s.time, reverse = True):
+            per_call = stat.time / stat.calls * 1e6 if stat.calls else 0.0
+            share = stat.time / total * 100 if total else 0.0
+            lines.append(f"{stat.name:<28}{stat.calls:>10}{stat.time:>10.3f}{per_call:>14.1f}{share:>9.1f}")
+        lines.append(f"{'wall time':<28}{'':>10}{total:>10.3f}")
+        return '\n'.join(lines)
+
+    def write_speedscope(self, path: str, name: str = "search"):
+        if not self.trace:
+            raise ValueError("Speedscope output needs Profiler(trace = True).")
+        profile = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "evented",
+                "name": name,
+                "unit": "seconds",
+                "startValue": self.start_time,
+                "endValue": self.end_time,
+                "events": self.events,
+            }],
+        }
+        with open(path, "w") as f:
+            json.dump(profile, f)
+
+
+def profile_search(engine: Engine, depth: int, pstats_path: str = None) -> pstats.Stats:
+    """Run one search under cProfile, optionally dumping the stats for pstats/snakeviz."""
+    profile = cProfile.Profile()
+    profile.enable()
+    engine.search(depth)
+    profile.disable()
+    stats = pstats.Stats(profile)
+    if pstats_path:
+        stats.dump_stats(pstats_path)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Profile one engine search.")
+    parser.add_argument("--fen", default = "r1bqk2r/ppp2ppp/2n2n2/2bpp1B1/2B1P3/P2P1N2/1PP3PP/RN1QK2R w KQkq - 0 1")
+    parser.add_argument("--depth", type = int, default = 3)
+    parser.add_argument("--pstats", help = "write cProfile stats to this file")
+    parser.add_argument("--speedscope", help = "write a speedscope JSON profile to this file")
+    args = parser.parse_args()
+
+    engine = Engine(Board(args.fen))
+    with Profiler(trace = args.speedscope is not None) as profiler:
+        score, move = engine.search(args.depth)
+    print(f"Depth {args.depth}: score {score}, move {move}, {engine.nodes} nodes")
+    print(profiler.report())
+    if args.speedscope:
+        profiler.write_speedscope(args.speedscope)
+
+    if args.pstats:
+        engine = Engine(Board(args.fen))
+        profile_search(engine, args.depth, args.pstats).sort_stats("cumulative").print_stats(15)
@@ -0,0 +1,469 @@
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from board import Board, game_phase, material_name
+from constants import WHITE, BLACK, TYPE_MASK, COLOR_MASK, MATE_SCORE, NO_SQUARE
+
+# File layout: magic, number of pieces, piece codes, then one signed byte per index
+# (stm * 64^n + sq_0 * 64^(n-1) + ... + sq_(n-1)), squares in Board order.
+MAGIC = b"ASTB"
+HEADER = struct.Struct("4sB")
+
+# Stored values (side to move perspective):
+# 0 draw, +d win with mate in d plies, -(d + 1) loss with mate in d plies.
+INVALID = -128
+MIN_MATE_SCORE = MATE_SCORE - 127 # Weakest tablebase win: dtm fits the signed byte
+PIECE_LETTERS = {'K': 6, 'Q': 5, 'R': 4, 'B': 3, 'N': 2, 'P': 1}
+
+
+def encode(wdl: int, dtm: int) -> int:
+    if wdl == 0:
+        return 0
+    return dtm if wdl > 0 else -(dtm + 1)
+
+
+def decode(value: int) -> tuple:
+    """Return (wdl, dtm): wdl is 1 win, 0 draw, -1 loss for the side to move."""
+    if value == 0:
+        return 0, 0
+    if value > 0:
+        return 1, value
+    return -1, -value - 1
+
+
+def flipped_name(name: str) -> str:
+    white, black = name.split('v')
+    return black + 'v' + white
+
+
+def name_to_pieces(name: str) -> list:
+    white, black = name.split('v')
+    return [PIECE_LETTERS[c] + WHITE for c in white] + [PIECE_LETTERS[c] + BLACK for c in black]
+
+
+def flip_position(board_pieces, active_color: str) -> tuple:
+    """Mirror the board vertically and swap colors (same game, other side's view)."""
+    flipped = [0] * 64
+    for square, piece in enumerate(board_pieces):
+        if piece != 0:
+            color = BLACK if (piece & COLOR_MASK) == WHITE else WHITE
+            flipped[square ^ 56] = (piece & TYPE_MASK) + color
+    return flipped, 'b' if active_color == 'w' else 'w'
+
+
+class Tablebase:
+    """Exact win/draw/loss + distance-to-mate tables for endings with up to 4 pieces."""
+
+    MAX_PIECES = 4
+
+    def __init__(self, directory: str = "tablebases"):
+        self.directory = directory
+        self.tables = {} # name -> (pieces, data)
+        self.missing = set()
+
+    def load(self, name: str):
+        """Return (pieces, data) for a material signature, or None if no file exists."""
+        if name in self.tables:
+            return self.tables[name]
+        if name in self.missing:
+            return None
+
+        path = os.path.join(self.directory, name + ".tb")
+        if not os.path.exists(path):
+            self.missing.add(name)
+            return None
+
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, number_of_pieces = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase file.")
+        pieces = list(data[HEADER.size:HEADER.size + number_of_pieces])
+        offset = HEADER.size + number_of_pieces
+        # Signed view over the mapped bytes, no copy
+        table = memoryview(data)[offset:].cast('b')
+
+        self.tables[name] = (pieces, table)
+        return self.tables[name]
+
+    def probe_position(self, board_pieces, active_color: str):
+        """Return (wdl, dtm) for the side to move, or None if the position is not covered."""
+        number_of_pieces = sum(1 for p in board_pieces if p != 0)
+        if number_of_pieces > self.MAX_PIECES:
+            return None
+        if number_of_pieces == 2:
+            return 0, 0 # Bare kings
+
+        name = material_name(board_pieces)
+        table = self.load(name)
+        if table is None:
+            table = self.load(flipped_name(name))
+            if table is None:
+                return None
+            board_pieces, active_color = flip_position(board_pieces, active_color)
+
+        pieces, data = table
+        value = data[position_index(pieces, board_pieces, active_color)]
+        if value == INVALID:
+            return None
+        return decode(value)
+
+    def probe(self, board: Board):
+        # Tables assume no castling rights
+        if board.castling_rights:
+            return None
+        return self.probe_position(board.board_pieces, board.active_color)
+
+    def score(self, board: Board):
+        """Tablebase result as a white-positive evaluation, or None.
+
+        Mates are counted from this position; search adds the ply it is
+        probed at (see Engine.evaluate_position) to compare them with its own.
+        """
+        result = self.probe(board)
+        if result is None:
+            return None
+        wdl, dtm = result
+        score = wdl * (MATE_SCORE - dtm)
+        return score if board.active_color == 'w' else -score
+
+    def best_move(self, board: Board, legal_moves: list):
+        """Pick the move with the best tablebase outcome: fastest win, else draw, else longest loss."""
+        if board.castling_rights:
+            return None
+
+        best_move, best_rank = None, None
+        for move in legal_moves:
+            child = apply_move(board.board_pieces, move)
+            child_color = 'b' if board.active_color == 'w' else 'w'
+            result = self.probe_position(child, child_color)
+            if result is None:
+                return None
+            wdl, dtm = result
+            # Rank from the mover's point of view (child wdl is the opponent's)
+            rank = (-wdl, -dtm if wdl < 0 else dtm)
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = move, rank
+        return best_move
+
+
+def position_index(pieces: list, board_pieces, active_color: str) -> int:
+    squares = {}
+    for square, piece in enumerate(board_pieces):
+        if piece != 0:
+            squares.setdefault(piece, []).append(square)
+
+    index = 0 if active_color == 'w' else 1
+    for piece in pieces:
+        index = index * 64 + squares[piece].pop()
+    return index
+
+
+def apply_move(board_pieces, move) -> list:
+    """Board contents after a move (no castling in tablebase positions)."""
+    src, dest, *promotion = move
+    child = list(board_pieces)
+    piece = child[src]
+    # En passant: pawn moving diagonally to an empty square
+    if (piece & TYPE_MASK) == 1 and child[dest] == 0 and (dest - src) % 8 != 0:
+        child[dest + 8 if (piece & COLOR_MASK) == WHITE else dest - 8] = 0
+    child[dest] = promotion[0] if promotion else piece
+    child[src] = 0
+    return child
+
+
+class TablebaseGenerator:
+    """Retrograde analysis using Board/Engine move generation.
+
+    Every position is visited once forwards (legal move count, mates, exits to
+    smaller tables) and then once backwards from each resolved position (un-moves),
+    processing distances in increasing order so the stored distance to mate is exact.
+    """
+
+    def __init__(self, tablebase: Tablebase):
+        # Imported here, engine imports this module
+        from engine import Engine
+        self.tablebase = tablebase
+        self.board = Board("8/8/8/8/8/8/8/8 w - - 0 1")
+        self.engine = Engine(self.board)
+
+    def generate(self, name: str, verbose: bool = True):
+        pieces = name_to_pieces(name)
+        self._ensure_subtables(pieces)
+
+        n = len(pieces)
+        size = 2 * 64 ** n
+        start_time = time.time()
+
+        values = array('b', [0]) * size
+        final = bytearray(size)
+        tentative = array('b', [0]) * size
+        counters = bytearray(size)
+        exit_draw = bytearray(size)
+        exit_loss = bytearray(size) # Longest loss through an exit (+1, 0 if none)
+        buckets = {}
+
+        # --- Forward pass ---
+        for index in range(size):
+            board_pieces, active_color = self._setup(pieces, index)
+            if board_pieces is None:
+                values[index] = INVALID
+                final[index] = 1
+                continue
+
+            legal_moves = self.engine.find_legal_moves()
+            if not legal_moves:
+                active = WHITE if active_color == 'w' else BLACK
+                king = board_pieces.index(6 + active)
+                if self.board.is_square_attacked(king, active):
+                    tentative[index] = encode(-1, 0)
+                    buckets.setdefault(0, []).append(index)
+                else:
+                    final[index] = 1 # Stalemate
+                continue
+
+            child_color = 'b' if active_color == 'w' else 'w'
+            in_table = 0
+            best_win = None
+            for move in legal_moves:
+                if self._is_exit(board_pieces, move):
+                    wdl, dtm = self.tablebase.probe_position(apply_move(board_pieces, move), child_color)
+                    if wdl < 0:
+                        best_win = dtm + 1 if best_win is None else min(best_win, dtm + 1)
+                    elif wdl == 0:
+                        exit_draw[index] = 1
+                    else:
+                        exit_loss[index] = max(exit_loss[index], dtm + 2)
+                else:
+                    in_table += 1
+            counters[index] = in_table
+
+            if best_win is not None:
+                tentative[index] = encode(1, best_win)
+                buckets.setdefault(best_win, []).append(index)
+            elif in_table == 0 and not exit_draw[index]:
+                # Every move leaves the table and loses
+                dtm = exit_loss[index] - 1
+                tentative[index] = encode(-1, dtm)
+                buckets.setdefault(dtm, []).append(index)
+
+        if verbose:
+            print(f"{name}: forward pass done in {time.time() - start_time:.1f} seconds")
+
+        # --- Retrograde pass ---
+        distance = 0
+        while buckets:
+            for index in buckets.pop(distance, []):
+                if final[index]:
+                    continue
+                wdl, dtm = decode(tentative[index])
+                if dtm != distance:
+                    continue
+                values[index] = tentative[index]
+                final[index] = 1
+
+                for parent in self._predecessors(pieces, index):
+                    if final[parent]:
+                        continue
+                    if wdl < 0:
+                        # We can move into a lost position for the opponent
+                        win = decode(tentative[parent])
+                        if win[0] <= 0 or win[1] > distance + 1:
+                            tentative[parent] = encode(1, distance + 1)
+                            buckets.setdefault(distance + 1, []).append(parent)
+                    else:
+                        counters[parent] -= 1
+                        if counters[parent] == 0 and not exit_draw[parent] and decode(tentative[parent])[0] <= 0:
+                            loss = max(distance + 1, exit_loss[parent] - 1)
+                            tentative[parent] = encode(-1, loss)
+                            buckets.setdefault(loss, []).append(parent)
+            distance += 1
+
+        # Whatever is left is a draw (values are already 0)
+        if verbose:
+            print(f"{name}: generated in {time.time() - start_time:.1f} seconds")
+
+        self.tablebase.tables[name] = (pieces, values)
+        self.tablebase.missing.discard(name)
+        return values
+
+    def verify(self, name: str, samples: int = 32, verbose: bool = True):
+        """Play won positions out with best_move for both sides; each must end in mate after exactly dtm plies.
+
+        The deepest win is always among the samples. Raises ValueError on the first failure.
+        """
+        from engine import Engine
+        pieces, values = self.tablebase.tables[name]
+        wins = sorted((index for index in range(len(values)) if values[index] > 0), key = lambda i: -values[i])
+        wins = wins[::max(1, len(wins) // samples)]
+        for index in wins:
+            self._setup(pieces, index)
+            board = Board(self.board.generate_fen())
+            engine = Engine(board)
+            dtm = decode(values[index])[1]
+            for _ in range(dtm):
+                move = self.tablebase.best_move(board, engine.find_legal_moves())
+                if move is None:
+                    break
+                board.make_move(move)
+            if engine.find_legal_moves() or not engine.is_check():
+                raise ValueError(f"{name}: no mate after {dtm} plies from {self.board.generate_fen()}")
+        if verbose:
+            print(f"{name}: {len(wins)} won positions played out to mate")
+
+    def save(self, name: str):
+        pieces, values = self.tablebase.tables[name]
+        os.makedirs(self.tablebase.directory, exist_ok = True)
+        path = os.path.join(self.tablebase.directory, name + ".tb")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(pieces)))
+            f.write(bytes(pieces))
+            f.write(values.tobytes())
+
+    def _ensure_subtables(self, pieces: list):
+        """Generate (and save) every table reachable by a capture or promotion."""
+        names = set()
+        for i, piece in enumerate(pieces):
+            rest = pieces[:i] + pieces[i + 1:]
+            if (piece & TYPE_MASK) != 6:
+                names.add(material_name(rest)) # Capture
+            if (piece & TYPE_MASK) == 1:
+                for promotion in [2, 3, 4, 5]:
+                    names.add(material_name(rest + [promotion + (piece & COLOR_MASK)]))
+
+        for name in names:
+            if name.count('K') != 2 or name == "KvK":
+                continue
+            if self.tablebase.load(name) is None and self.tablebase.load(flipped_name(name)) is None:
+                self.generate(name)
+                self.save(name)
+
+    def _setup(self, pieces: list, index: int):
+        """Put position number index on the board, or return None if it is illegal."""
+        squares = []
+        rest = index
+        for _ in pieces:
+            rest, square = divmod(rest, 64)
+            squares.append(square)
+        squares.reverse()
+        active_color = 'w' if rest == 0 else 'b'
+
+        if len(set(squares)) != len(squares):
+            return None, active_color
+
+        board_pieces = [0] * 64
+        for piece, square in zip(pieces, squares):
+            if (piece & TYPE_MASK) == 1 and square // 8 in [0, 7]:
+                return None, active_color
+            board_pieces[square] = piece
+
+        self.board.board_pieces = board_pieces
+        self.board.active_color = active_color
+        self.board.castling_rights = 0
+        self.board.en_passant = NO_SQUARE
+        self.board.phase = game_phase(pieces)
+        self.board.occupied = sum(1 << square for square in squares)
+        self.board.attack_cache = None
+
+        # Side not to move must not be in check
+        passive = BLACK if active_color == 'w' else WHITE
+        if self.board.is_square_attacked(board_pieces.index(6 + passive), passive):
+            return None, active_color
+
+        return board_pieces, active_color
+
+    def _is_exit(self, board_pieces, move) -> bool:
+        src, dest, *promotion = move
+        if promotion or board_pieces[dest] != 0:
+            return True
+        # En passant
+        return (board_pieces[src] & TYPE_MASK) == 1 and (dest - src) % 8 != 0
+
+    def _predecessors(self, pieces: list, index: int) -> list:
+        """Indices of positions that reach this one with a non-capturing move."""
+        board_pieces, active_color = self._setup_unchecked(pieces, index)
+        mover = BLACK if active_color == 'w' else WHITE
+        parent_stm = 0 if mover == WHITE else 1
+
+        parents = []
+        for i, piece in enumerate(pieces):
+            if (piece & COLOR_MASK) != mover:
+                continue
+            square = (index // 64 ** (len(pieces) - 1 - i)) % 64
+            for origin_square in self._unmoves(board_pieces, piece, square):
+                parents.append(self._replace_square(pieces, index, i, origin_square, parent_stm))
+        return parents
+
+    def _unmoves(self, board_pieces, piece, square) -> list:
+        piece_type = piece & TYPE_MASK
+        origins = []
+
+        if piece_type == 1:
+            # Pawns walk back; they can not have come from their first rank
+            direction = 8 if (piece & COLOR_MASK) == WHITE else -8
+            start_row = 6 if (piece & COLOR_MASK) == WHITE else 1
+            back = square + direction
+            if 0 <= back < 64 and board_pieces[back] == 0:
+                if back // 8 not in [0, 7]:
+                    origins.append(back)
+                double_back = back + direction
+                if back // 8 + direction // 8 == start_row and board_pieces[double_back] == 0:
+                    origins.append(double_back)
+            return origins
+
+        # Pieces move symmetrically: reuse the forward generators, empty squares only
+        moves = []
+        match piece_type:
+            case 2:
+                self.engine._find_knight_moves(square, moves)
+            case 3:
+                self.engine._find_sliding_moves(square, 3, moves)
+            case 4:
+                self.engine._find_sliding_moves(square, 4, moves)
+            case 5:
+                self.engine._find_sliding_moves(square, 5, moves)
+            case 6:
+                self.engine._find_king_moves(square, moves)
+        return [move[1] for move in moves if board_pieces[move[1]] == 0]
+
+    def _setup_unchecked(self, pieces: list, index: int):
+        board_pieces = [0] * 64
+        occupied = 0
+        rest = index
+        for piece in reversed(pieces):
+            rest, square = divmod(rest, 64)
+            board_pieces[square] = piece
+            occupied |= 1 << square
+        active_color = 'w' if rest == 0 else 'b'
+        self.board.board_pieces = board_pieces
+        self.board.active_color = active_color
+        self.board.castling_rights = 0
+        self.board.en_passant = NO_SQUARE
+        self.board.phase = game_phase(pieces)
+        self.board.occupied = occupied
+        self.board.attack_cache = None
+        return board_pieces, active_color
+
+    def _replace_square(self, pieces: list, index: int, i: int, square: int, stm: int) -> int:
+        n = len(pieces)
+        weight = 64 ** (n - 1 - i)
+        old_square = (index // weight) % 64
+        index += (square - old_square) * weight
+        return stm * 64 ** n + index % 64 ** n
+
+
+if __name__ == "__main__":
+    # Usage: python tablebase.py KQvK KRvK KPvK [directory]
+    names = [arg for arg in sys.argv[1:] if 'v' in arg]
+    directory = next((arg for arg in sys.argv[1:] if 'v' not in arg), "tablebases")
+    tablebase = Tablebase(directory)
+    generator = TablebaseGenerator(tablebase)
+    for name in names or ["KQvK", "KRvK", "KPvK"]:
+        if len(name) - 1 > Tablebase.MAX_PIECES:
+            raise ValueError(f"{name}: at most {Tablebase.MAX_PIECES} pieces are supported.")
+        generator.generate(name)
+        generator.verify(name)
+        generator.save(name)
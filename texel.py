@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import time
+import numpy as np
+from board import Board
+from evaluator import Evaluator, DEFAULT_PARAMETERS, FEATURES, TERMS, load_parameters, save_parameters
+from batch_evaluator import BatchEvaluator
+from constants import MAX_PHASE
+from pgn import read_games
+
+RESULT_PATTERN = re.compile(r'"(1-0|0-1|1/2-1/2)"|\[(1\.0|0\.5|0\.0|1|0)\]')
+RESULT_LABELS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5, "1.0": 1.0, "0.5": 0.5, "0.0": 0.0, "1": 1.0, "0": 0.0}
+CHUNK_SIZE = 2000 # Positions (or games) per extraction task
+KING_FEATURES = TERMS["king_position"]
+
+
+# Loading labeled positions
+
+def read_labeled_fens(path: str):
+    """Yield (fen, white score) from EPD/FEN lines labeled with c9 "1-0" or [1.0] style results."""
+    with open(path) as f:
+        for line in f:
+            match = RESULT_PATTERN.search(line)
+            if not match:
+                continue
+            fields = line[:match.start()].replace(" c9 ", " ").split(";")[0].split()
+            if len(fields) >= 6 and fields[4].isdigit():
+                fen = " ".join(fields[:6])
+            elif len(fields) >= 4:
+                fen = " ".join(fields[:4]) + " 0 1"
+            else:
+                continue
+            yield fen, RESULT_LABELS[match.group(1) or match.group(2)]
+
+
+def read_tasks(path: str):
+    """Extraction tasks of CHUNK_SIZE items: ("fens", [(fen, label)]) or ("games", [Game])."""
+    if path.endswith(".pgn"):
+        items, kind = _games_with_result(path), "games"
+    else:
+        items, kind = read_labeled_fens(path), "fens"
+
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == CHUNK_SIZE:
+            yield kind, chunk
+            chunk = []
+    if chunk:
+        yield kind, chunk
+
+
+def _games_with_result(path: str):
+    with open(path) as f:
+        for game in read_games(f):
+            if game.result in RESULT_LABELS:
+                yield game
+
+
+# Feature extraction
+
+def extract_features(task: tuple) -> tuple:
+    """Features (int8, FEATURES order), phase and label of every position of one task."""
+    kind, items = task
+    evaluator = Evaluator()
+    pieces, king_features, phases, labels = [], [], [], []
+
+    def add(board, label):
+        features = dict.fromkeys(KING_FEATURES, 0)
+        evaluator.king_position_features(board, features) # Needs attack maps: scalar only
+        pieces.append(board.board_pieces[:])
+        king_features.append([features[name] for name in KING_FEATURES])
+        phases.append(min(board.phase, MAX_PHASE))
+        labels.append(label)
+
+    if kind == "fens":
+        for fen, label in items:
+            try:
+                board = Board(fen)
+            except (ValueError, KeyError, IndexError):
+                continue # Skip malformed lines
+            add(board, label)
+    else:
+        for game in items:
+            label = RESULT_LABELS[game.result]
+            try:
+                for board, move in game.positions():
+                    add(board, label)
+            except ValueError:
+                continue # Illegal or ambiguous move: keep the positions before it
+
+    count = len(labels)
+    matrix = np.zeros((count, len(FEATURES)), dtype = np.int8)
+    if count:
+        # Everything but the king term in one vectorized batch
+        batch = BatchEvaluator().features(np.array(pieces, dtype = np.int8))
+        for i, name in enumerate(FEATURES):
+            if name in batch:
+                matrix[:, i] = batch[name]
+        king_columns = [FEATURES.index(name) for name in KING_FEATURES]
+        matrix[:, king_columns] = np.array(king_features, dtype = np.int8).reshape(count, -1)
+    return matrix, np.array(phases, dtype = np.int8), np.array(labels, dtype = np.float32)
+
+
+def cache_key(paths: list) -> str:
+    """Input files (path, size, mtime) and feature list: any change means a new extraction."""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    digest.update(",".join(FEATURES).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_dataset(paths: list, workers: int = None, cache_dir: str = ".texel_cache") -> tuple:
+    """(features, phase, labels) of all positions, extracted in parallel and cached on disk."""
+    cache_path = os.path.join(cache_dir, cache_key(paths) + ".npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        data = np.load(cache_path)
+        print(f"Loaded {len(data['labels'])} positions from {cache_path}")
+        return data["features"], data["phase"], data["labels"]
+
+    start_time = time.time()
+    parts = []
+    with multiprocessing.Pool(workers) as pool:
+        for path in paths:
+            parts.extend(pool.imap(extract_features, read_tasks(path)))
+    parts = [part for part in parts if len(part[2])] or [extract_features(("fens", []))]
+    features = np.concatenate([part[0] for part in parts])
+    phase = np.concatenate([part[1] for part in parts])
+    labels = np.concatenate([part[2] for part in parts])
+    print(f"Extracted {len(labels)} positions in {time.time() - start_time:.1f} seconds")
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok = True)
+        np.savez(cache_path, features = features, phase = phase, labels = labels)
+    return features, phase, labels
+
+
+# Optimization
+
+_shard = None
+
+
+def _init_worker(features, phase, labels):
+    global _shard
+    _shard = (features, phase, labels)
+
+
+def _shard_gradient(task: tuple) -> tuple:
+    """Sum of squared errors and its gradient over rows start:end of the dataset."""
+    start, end, weights, k = task
+    features, phase, labels = _shard
+    counts = features[start:end].astype(np.float32)
+    mg_share = (phase[start:end].astype(np.float32) / MAX_PHASE)[:, None]
+
+    # Linear tapered eval: columns [count * phase share | count * (1 - phase share)]
+    x = np.hstack([counts * mg_share, counts * (1 - mg_share)])
+    scores = x @ weights
+    predicted = 1 / (1 + np.power(10, -k * scores / 400))
+    errors = labels[start:end] - predicted
+    d_score = -2 * errors * predicted * (1 - predicted) * k * math.log(10) / 400
+    return float(errors @ errors), x.T @ d_score
+
+
+class TexelTuner:
+    """Minimize the mean squared error between game results and sigmoid(eval).
+
+    The dataset is split into one shard per core; every epoch each worker
+    returns its shard's error and gradient, which an Adam step combines.
+    """
+
+    def __init__(self, features, phase, labels, parameters: dict = None, frozen: list = None, workers: int = None):
+        self.features, self.phase, self.labels = features, phase, labels
+        parameters = parameters or DEFAULT_PARAMETERS
+        self.weights = np.array([parameters[name][0] for name in FEATURES] + [parameters[name][1] for name in FEATURES], dtype = np.float64)
+        self.trainable = np.ones(len(self.weights), dtype = bool)
+        for name in frozen or []:
+            i = FEATURES.index(name)
+            self.trainable[[i, i + len(FEATURES)]] = False
+
+        self.workers = workers or multiprocessing.cpu_count()
+        step = max(1, math.ceil(len(labels) / self.workers))
+        self.shards = [(start, min(start + step, len(labels))) for start in range(0, len(labels), step)]
+        self.pool = multiprocessing.Pool(self.workers, _init_worker, (features, phase, labels))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def error_and_gradient(self, weights: np.ndarray, k: float) -> tuple:
+        results = self.pool.map(_shard_gradient, [(start, end, weights, k) for start, end in self.shards])
+        error = sum(result[0] for result in results) / len(self.labels)
+        gradient = sum(result[1] for result in results) / len(self.labels)
+        return error, gradient
+
+    def fit_scaling(self, low: float = 0.1, high: float = 3.0, steps: int = 20) -> float:
+        """Golden section search of the sigmoid scaling K for the current weights."""
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(steps):
+            a = high - ratio * (high - low)
+            b = low + ratio * (high - low)
+            if self.error_and_gradient(self.weights, a)[0] < self.error_and_gradient(self.weights, b)[0]:
+                high = b
+            else:
+                low = a
+        return (low + high) / 2
+
+    def tune(self, epochs: int, k: float, learning_rate: float = 1.0, report_every: int = 10) -> float:
+        """Adam on the trainable weights, returns the final error."""
+        m = np.zeros_like(self.weights)
+        v = np.zeros_like(self.weights)
+        beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+        error = None
+
+        for epoch in range(1, epochs + 1):
+            error, gradient = self.error_and_gradient(self.weights, k)
+            gradient = np.where(self.trainable, gradient, 0.0)
+            m = beta1 * m + (1 - beta1) * gradient
+            v = beta2 * v + (1 - beta2) * gradient ** 2
+            m_hat = m / (1 - beta1 ** epoch)
+            v_hat = v / (1 - beta2 ** epoch)
+            self.weights -= learning_rate * m_hat / (np.sqrt(v_hat) + epsilon)
+            if epoch % report_every == 0 or epoch == epochs:
+                print(f"Epoch {epoch}: error {error:.6f}")
+        return error
+
+    def parameters(self) -> dict:
+        n = len(FEATURES)
+        return {name: (int(round(self.weights[i])), int(round(self.weights[i + n]))) for i, name in enumerate(FEATURES)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Texel tuning of the evaluation parameters.")
+    parser.add_argument("inputs", nargs = "+", help = "EPD/FEN files with results (c9 \"1-0\" or [1.0]) or PGN files")
+    parser.add_argument("--output", default = "parameters.json")
+    parser.add_argument("--start", help = "parameter file to start from (default: built-in weights)")
+    parser.add_argument("--epochs", type = int, default = 200)
+    parser.add_argument("--learning-rate", type = float, default = 1.0)
+    parser.add_argument("--k", type = float, help = "sigmoid scaling (fitted when omitted)")
+    parser.add_argument("--freeze", default = "pawn", help = "comma separated features kept fixed")
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--cache-dir", default = ".texel_cache", help = "feature cache directory ('' to disable)")
+    args = parser.parse_args()
+
+    features, phase, labels = load_dataset(args.inputs, args.workers, args.cache_dir)
+    start_parameters = load_parameters(args.start) if args.start else DEFAULT_PARAMETERS
+    frozen = [name for name in args.freeze.split(",") if name]
+    tuner = TexelTuner(features, phase, labels, start_parameters, frozen, args.workers)
+    try:
+        k = args.k if args.k is not None else tuner.fit_scaling()
+        print(f"K = {k:.4f}, start error {tuner.error_and_gradient(tuner.weights, k)[0]:.6f}")
+        tuner.tune(args.epochs, k, args.learning_rate)
+    finally:
+        tuner.close()
+
+    save_parameters(args.output, tuner.parameters())
+    print(f"Wrote {args.output}")